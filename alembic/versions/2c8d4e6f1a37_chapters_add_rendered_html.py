@@ -0,0 +1,34 @@
+"""Chapters: add pre-rendered content HTML
+
+Revision ID: 2c8d4e6f1a37
+Revises: 9e3a5c7b1d24
+Create Date: 2026-10-17 13:12:48.203511
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c8d4e6f1a37'
+down_revision: Union[str, Sequence[str], None] = '9e3a5c7b1d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing chapters are rendered in memory when viewed until they are rewritten
+    with op.batch_alter_table('chapter', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_html', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('content_html_version', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('chapter', schema=None) as batch_op:
+        batch_op.drop_column('content_html_version')
+        batch_op.drop_column('content_html')
@@ -0,0 +1,50 @@
+"""Add job table for background book finalization
+
+Revision ID: 4b1f0c2d7e91
+Revises: dc5ad7809e03
+Create Date: 2026-10-17 09:12:41.118304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b1f0c2d7e91'
+down_revision: Union[str, Sequence[str], None] = 'dc5ad7809e03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('state', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('book_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['book_id'], ['book.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # At most one pending or running job of each kind per book
+    op.create_index(
+        'ux_job_book_id_kind_active',
+        'job',
+        ['book_id', 'kind'],
+        unique=True,
+        sqlite_where=sa.text("status IN ('pending', 'running')"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_job_book_id_kind_active', table_name='job')
+    op.drop_table('job')
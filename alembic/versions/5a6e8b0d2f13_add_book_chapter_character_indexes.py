@@ -0,0 +1,63 @@
+"""Add indexes and unique chapter numbers
+
+Revision ID: 5a6e8b0d2f13
+Revises: 7d2f9a1c3e58
+Create Date: 2026-10-17 15:02:41.774205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a6e8b0d2f13'
+down_revision: Union[str, Sequence[str], None] = '7d2f9a1c3e58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _delete_duplicate_chapters() -> None:
+    """
+    Concurrent materialization could create a chapter number twice. Keep the
+    copy with the most progress (any status but 'draft', then the oldest).
+    """
+    connection = op.get_bind()
+    chapter = sa.table('chapter', sa.column('id'), sa.column('book_id'), sa.column('chapter_number'), sa.column('status'))
+    rows = connection.execute(
+        sa.select(chapter.c.id, chapter.c.book_id, chapter.c.chapter_number, chapter.c.status)
+        .order_by(chapter.c.book_id, chapter.c.chapter_number, chapter.c.id)
+    ).all()
+
+    keep = {}
+    duplicates = []
+    for row in rows:
+        key = (row.book_id, row.chapter_number)
+        kept = keep.get(key)
+        if kept is None:
+            keep[key] = row
+        elif kept.status == 'draft' and row.status != 'draft':
+            duplicates.append(kept.id)
+            keep[key] = row
+        else:
+            duplicates.append(row.id)
+
+    if duplicates:
+        connection.execute(sa.delete(chapter).where(chapter.c.id.in_(duplicates)))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _delete_duplicate_chapters()
+    op.create_index('ix_book_status_created_at', 'book', ['status', 'created_at'], unique=False)
+    op.create_index('ix_chapter_book_id_chapter_number', 'chapter', ['book_id', 'chapter_number'], unique=True)
+    op.create_index(op.f('ix_character_book_id'), 'character', ['book_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_character_book_id'), table_name='character')
+    op.drop_index('ix_chapter_book_id_chapter_number', table_name='chapter')
+    op.drop_index('ix_book_status_created_at', table_name='book')
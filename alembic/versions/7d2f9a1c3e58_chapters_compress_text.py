@@ -0,0 +1,55 @@
+"""Chapters: compress stored text
+
+Revision ID: 7d2f9a1c3e58
+Revises: 2c8d4e6f1a37
+Create Date: 2026-10-17 14:26:09.118342
+
+Converts the text columns of existing chapters to the CompressedText storage
+format with the codec configured in CHAPTER_TEXT_COMPRESSION. The schema does
+not change. Run VACUUM on the database afterwards to give the freed pages back
+to the file system.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+from app import config
+from app.models.types import compress_text, decompress_text
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2f9a1c3e58'
+down_revision: Union[str, Sequence[str], None] = '2c8d4e6f1a37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TEXT_COLUMNS = ('content', 'partial_content', 'content_html', 'previous_storyline')
+
+
+def _convert_rows(convert) -> None:
+    connection = op.get_bind()
+    chapter = sa.table('chapter', sa.column('id'), *(sa.column(name) for name in TEXT_COLUMNS))
+    rows = connection.execute(sa.select(chapter)).mappings().all()
+    for row in rows:
+        values = {}
+        for name in TEXT_COLUMNS:
+            converted = convert(row[name])
+            if converted is not row[name]:
+                values[name] = converted
+        if values:
+            connection.execute(sa.update(chapter).where(chapter.c.id == row['id']).values(**values))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    codec = config.CHAPTER_TEXT_COMPRESSION
+    if not codec:
+        return
+    _convert_rows(lambda value: compress_text(value, codec) if isinstance(value, str) else value)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _convert_rows(lambda value: decompress_text(value) if isinstance(value, bytes) else value)
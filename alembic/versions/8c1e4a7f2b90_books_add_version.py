@@ -0,0 +1,31 @@
+"""Books: add version
+
+Revision ID: 8c1e4a7f2b90
+Revises: 5a6e8b0d2f13
+Create Date: 2026-10-17 16:21:07.518392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c1e4a7f2b90'
+down_revision: Union[str, Sequence[str], None] = '5a6e8b0d2f13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('book', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('book', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,31 @@
+"""Chapters: add partial content checkpoint
+
+Revision ID: 9e3a5c7b1d24
+Revises: 4b1f0c2d7e91
+Create Date: 2026-10-17 11:03:27.540912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e3a5c7b1d24'
+down_revision: Union[str, Sequence[str], None] = '4b1f0c2d7e91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('chapter', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('partial_content', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('chapter', schema=None) as batch_op:
+        batch_op.drop_column('partial_content')
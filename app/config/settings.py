@@ -11,15 +11,121 @@ OPENAI_API_KEY = "ollama"  # For Ollama, the API key can be any string
 # AI Model Configuration
 LLM_MODEL = "gemma-3-27b"
 EMBEDDING_MODEL = "embedder"
+# Texts that are not cached are sent to the embedding endpoint in batches of at most this size
+EMBEDDING_BATCH_SIZE = 64
+# Embeddings are cached by (model, text hash) as float32 blobs; None disables the cache file
+EMBEDDING_CACHE_SQLITE_PATH = "book_db/embedding_cache.db"
+
+# LLM Connection Pool Configuration
+# A single pool per backend host is shared by all requests for the lifetime of the app
+LLM_POOL_MAX_CONNECTIONS_PER_HOST = 20
+LLM_POOL_MAX_KEEPALIVE_CONNECTIONS = 10
+LLM_POOL_KEEPALIVE_EXPIRY = 60.0  # seconds an idle connection is kept open
+LLM_REQUEST_TIMEOUT = 600.0  # chapter streams can take several minutes
+LLM_CONNECT_TIMEOUT = 10.0
+LLM_MAX_RETRIES = 2
+
+# LLM Scheduler Configuration
+# Should match the number of parallel request slots of the backend (e.g. llama.cpp --parallel)
+LLM_MAX_CONCURRENCY = 4
+# Slots kept free for short interactive calls (wizard comments, suggestions)
+LLM_RESERVED_INTERACTIVE_SLOTS = 1
+
+# LLM Response Cache Configuration
+# Caches plain text responses (e.g. wizard comments) keyed by template, prompt, model and temperature
+LLM_CACHE_ENABLED = True
+LLM_CACHE_MAX_ENTRIES = 512  # in-memory LRU tier
+LLM_CACHE_TTL_SECONDS = 86400  # None keeps entries until evicted
+LLM_CACHE_SQLITE_PATH = "book_db/llm_cache.db"  # None disables the persistent tier
+LLM_CACHE_SQLITE_MAX_ENTRIES = 10000
 
 # Database Configuration
 DATABASE_URL = "sqlite:///book_db/bookfactory.db"
+# Log every SQL statement
+DB_ECHO = False
+# SQLite storage profile, applied to every connection. WAL lets readers work
+# while a writer commits; with WAL, synchronous=NORMAL is still crash-safe.
+DB_JOURNAL_MODE = "WAL"
+DB_SYNCHRONOUS = "NORMAL"
+# How long a connection waits for a lock held by another writer
+DB_BUSY_TIMEOUT_MS = 5000
+DB_MMAP_SIZE_BYTES = 256 * 1024 * 1024
+DB_CACHE_SIZE_KIB = 64 * 1024
+# Connection pools: sessions that may write, and read-only sessions (query_only)
+# used by pure read endpoints. SQLite runs one write transaction at a time;
+# the others wait up to DB_BUSY_TIMEOUT_MS.
+DB_WRITER_POOL_SIZE = 5
+DB_WRITER_MAX_OVERFLOW = 5
+DB_READER_POOL_SIZE = 8
+DB_POOL_TIMEOUT_SECONDS = 30
+# Small writes (status changes, checkpoints, summaries) are committed together:
+# the first write waits this long for others, up to WRITE_QUEUE_MAX_BATCH writes
+WRITE_QUEUE_WINDOW_MS = 10
+WRITE_QUEUE_MAX_BATCH = 100
+
+# Chapter Text Storage
+# Chapter prose is stored compressed: "zstd", "zlib" or None to store plain text.
+# Existing rows stay readable when this changes.
+CHAPTER_TEXT_COMPRESSION = "zstd"
+# Shorter texts are not worth compressing
+CHAPTER_TEXT_COMPRESSION_MIN_CHARS = 512
+
+# Bookshelf Configuration
+# Books loaded per page of the sidebar bookshelf; more are loaded while scrolling
+BOOKSHELF_PAGE_SIZE = 30
 
 # Vector Database Configuration
+# The vector store is opened lazily on first use; set to False to disable it entirely
+VECTOR_STORE_ENABLED = True
+# "numpy": memory-mapped float32 matrix per book, searched in-process (no chromadb needed)
+# "chroma": persistent Chroma database
+VECTOR_BACKEND = "numpy"
 DB_LOCATION = "book_db"
+# Shared collection for characters that do not belong to a book (CLI samples)
 COLLECTION_NAME = "characters"
+# Every book has its own collection named with this prefix and the book id
+BOOK_COLLECTION_PREFIX = "book_"
 RETRIEVER_K = 5
 
+# Character selection for chapter prompts
+# Books whose assembled prompt context (character sheets, chapter events) is kept in memory
+BOOK_CONTEXT_CACHE_SIZE = 32
+# Casts up to this size always get full character sheets
+CHARACTER_CONTEXT_MIN_CAST = 4
+# Most supporting characters with full sheets per chapter (protagonists always have one)
+CHARACTER_CONTEXT_MAX_FULL = 4
+# Relevance a supporting character needs for a full sheet (a name mention scores 1.5-2)
+CHARACTER_CONTEXT_MIN_SCORE = 0.5
+# Add embedding similarity to name and word matching (uses the vector store's embedding cache)
+CHARACTER_CONTEXT_USE_EMBEDDINGS = True
+
+# Retrieval over completed chapters
+# Completed chapters are indexed in chunks of about this many characters
+RAG_CHUNK_CHARS = 1200
+RAG_CHUNK_OVERLAP_CHARS = 200
+# Passages considered for a chapter prompt, and the token budget they must fit in
+RAG_TOP_K = 8
+RAG_CONTEXT_TOKEN_BUDGET = 1200
+# Index completed chapters missing from the vector store (e.g. completed before indexing existed) on startup
+RAG_BACKFILL_ON_STARTUP = True
+
+# Chapter Streaming Configuration
+# Finished generations are kept this long so reconnecting clients can catch up
+CHAPTER_STREAM_LINGER_SECONDS = 60
+# Text generated so far is saved to the chapter every N chunks or seconds, whichever comes first
+CHAPTER_CHECKPOINT_CHUNKS = 50
+CHAPTER_CHECKPOINT_SECONDS = 5.0
+# Streamed chunks are sent as one SSE frame once this many bytes are buffered
+# or this many milliseconds after the first buffered chunk, whichever comes first
+SSE_COALESCE_MAX_BYTES = 512
+SSE_COALESCE_MAX_DELAY_MS = 50
+# How long shutdown waits for pending chapter writes
+SHUTDOWN_DRAIN_TIMEOUT = 30.0
+# Continue chapters left in a writing state from their last checkpoint on startup
+# and when a client reattaches to such a chapter; chapters without a checkpoint
+# and failed chapters are only resumed or rewritten by the user
+CHAPTER_RECOVERY_ON_STARTUP = True
+
 # Book Generation Settings
 DEFAULT_WORLD_PARAMS = "a mess hall during world war 2"
 DEFAULT_STORY_BITS = "a cook serving food to his fellow soldiers"
@@ -27,4 +133,9 @@ DEFAULT_NUMBER_OF_CHAPTERS = 5
 DEFAULT_NUMBER_OF_CHARS = 5
 DEFAULT_NUMBER_OF_MAIN_CHARS = 2
 DEFAULT_NUMBER_OF_SUPPORT_CHARS = 3
-DEFAULT_NUMBER_OF_EVENTS = 3 
+DEFAULT_NUMBER_OF_EVENTS = 3
+
+# Character sheets are generated in parallel when a book is finalized
+CHARACTER_SHEET_CONCURRENCY = 4
+CHARACTER_SHEET_RETRIES = 2
+CHARACTER_SHEET_RETRY_DELAY = 2.0  # seconds, multiplied by the attempt number
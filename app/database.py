@@ -1,6 +1,8 @@
 # app/database.py
 
+import logging
 from sqlmodel import SQLModel
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from app import config
 import os
@@ -11,14 +13,83 @@ DATABASE_URL = config.DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://")
 if not os.path.exists(config.DB_LOCATION):
     os.makedirs(config.DB_LOCATION)
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+
+def _set_sqlite_pragmas(dbapi_connection, read_only: bool) -> None:
+    """Applies the storage profile from the config to a new connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        if not read_only:
+            # Persistent in the database file; only the writer needs to set it
+            cursor.execute(f"PRAGMA journal_mode={config.DB_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={config.DB_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config.DB_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA mmap_size={int(config.DB_MMAP_SIZE_BYTES)}")
+        # A negative cache size is in KiB instead of pages
+        cursor.execute(f"PRAGMA cache_size=-{int(config.DB_CACHE_SIZE_KIB)}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+def _create_engine(read_only: bool, pool_size: int, max_overflow: int):
+    engine = create_async_engine(
+        DATABASE_URL,
+        echo=config.DB_ECHO,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=config.DB_POOL_TIMEOUT_SECONDS,
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        _set_sqlite_pragmas(dbapi_connection, read_only)
+
+    return engine
+
+
+engine = _create_engine(
+    read_only=False, pool_size=config.DB_WRITER_POOL_SIZE, max_overflow=config.DB_WRITER_MAX_OVERFLOW
+)
+read_engine = _create_engine(read_only=True, pool_size=config.DB_READER_POOL_SIZE, max_overflow=0)
+
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+async_read_session_maker = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
 
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
 
+async def report_database_settings() -> dict:
+    """Logs the storage settings SQLite actually applied (and returns them)."""
+    settings = {}
+    for label, database_engine in (("writer", engine), ("reader", read_engine)):
+        async with database_engine.connect() as conn:
+            effective = {}
+            for pragma in ("journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size", "query_only"):
+                result = await conn.execute(text(f"PRAGMA {pragma}"))
+                effective[pragma] = result.scalar()
+        effective["pool_size"] = database_engine.pool.size()
+        settings[label] = effective
+        logging.info(f"Database {label} settings: {effective}")
+
+    if str(settings["writer"]["journal_mode"]).lower() != config.DB_JOURNAL_MODE.lower():
+        logging.warning(
+            f"Database journal mode is {settings['writer']['journal_mode']}, not {config.DB_JOURNAL_MODE} as configured"
+        )
+    return settings
+
 async def get_session() -> AsyncSession:
     """Dependency to get an async database session."""
     async with async_session_maker() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+async def get_read_session() -> AsyncSession:
+    """Dependency to get a read-only async database session."""
+    async with async_read_session_maker() as session:
+        yield session
+
+async def close_db() -> None:
+    """Closes all pooled connections."""
+    await engine.dispose()
+    await read_engine.dispose()
@@ -1,8 +1,17 @@
 # app/main.py
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from app.database import init_db
+from app import config
+from app.database import close_db, init_db, report_database_settings
 from app.routers import views, ai, wizard, book
+from app.services.ai_service import reset_ai_service
+from app.services.background import task_tracker
+from app.services.chapter_stream import chapter_generations
+from app.services.chapter_writer import index_unindexed_chapters, recover_interrupted_chapters
+from app.services.job_service import job_manager
+from app.services.llm_client import llm_clients
+from app.services.vector_store import configure_vector_store, close_vector_store
+from app.services.write_queue import write_queue
 
 app = FastAPI()
 
@@ -10,9 +19,30 @@ app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
 @app.on_event("startup")
 async def on_startup():
+    llm_clients.open()
+    write_queue.start()
+    configure_vector_store(enabled=config.VECTOR_STORE_ENABLED)
     await init_db()
+    await report_database_settings()
+    await job_manager.resume_pending()
+    if config.CHAPTER_RECOVERY_ON_STARTUP:
+        task_tracker.spawn(recover_interrupted_chapters(), name="chapter recovery")
+    if config.VECTOR_STORE_ENABLED and config.RAG_BACKFILL_ON_STARTUP:
+        task_tracker.spawn(index_unindexed_chapters(), name="chapter index backfill")
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await job_manager.shutdown()
+    await chapter_generations.shutdown()
+    # Final chapter writes and checkpoints must land before the database goes away
+    await task_tracker.drain(timeout=config.SHUTDOWN_DRAIN_TIMEOUT)
+    await write_queue.close()
+    close_vector_store()
+    await close_db()
+    reset_ai_service()
+    await llm_clients.aclose()
 
 app.include_router(views.router)
 app.include_router(ai.router)
 app.include_router(wizard.router)
-app.include_router(book.router)
\ No newline at end of file
+app.include_router(book.router)
@@ -10,6 +10,7 @@ validation for data flowing between services and external systems.
 """
 
 from dataclasses import dataclass, field
+from datetime import datetime
 from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 
@@ -76,6 +77,32 @@ class CharacterCollection:
                 return char
         return None
 
+@dataclass
+class ChapterPromptContext:
+    """The parts of a book needed to build the prompt for one of its chapters."""
+    world_description: Optional[str]
+    user_prompt: Optional[str]
+    total_chapters: int
+    # Formatted events of the chapter from the book concept
+    chapter_events: str = ""
+    # Character profiles (app.services.prompt_context.CharacterProfile) of the book
+    characters: list = field(default_factory=list)
+    # Estimated tokens of the full sheets of all characters
+    character_tokens: int = 0
+    previous_storyline: Optional[str] = None
+    previous_chapter_ending: str = ""
+
+@dataclass
+class BookshelfEntry:
+    """A book as listed on the bookshelf, with counts instead of related rows."""
+    id: int
+    title: Optional[str]
+    status: str
+    created_at: datetime
+    chapters_total: int = 0
+    chapters_completed: int = 0
+    characters_count: int = 0
+
 class BookChapterEvent(BaseModel):
     """Pydantic model for a book chapter event."""
     event_title: str
@@ -9,10 +9,16 @@ the ORM layer for database interactions.
 from datetime import datetime
 from typing import List, Optional
 
+from sqlalchemy import Index, text
 from sqlmodel import Field, Relationship, SQLModel, Column, JSON, Text
 
+from app.models.types import CompressedText
+
 
 class Book(SQLModel, table=True):
+    # The bookshelf filters on status and pages by created_at
+    __table_args__ = (Index("ix_book_status_created_at", "status", "created_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     title: Optional[str] = None
     user_prompt: Optional[str] = None
@@ -21,12 +27,18 @@ class Book(SQLModel, table=True):
     llm_concept: Optional[dict] = Field(default=None, sa_column=Column(JSON))
     status: str = "draft"
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    # Bumped whenever the characters, world or concept change; cached prompt
+    # context of an older version is discarded
+    version: int = Field(default=1, nullable=False, sa_column_kwargs={"server_default": "1"})
 
     chapters: List["Chapter"] = Relationship(back_populates="book")
     characters: List["Character"] = Relationship(back_populates="book")
 
 
 class Chapter(SQLModel, table=True):
+    # Chapters are looked up by number, and each number exists once per book
+    __table_args__ = (Index("ix_chapter_book_id_chapter_number", "book_id", "chapter_number", unique=True),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     chapter_number: int
     title: str
@@ -39,14 +51,25 @@ class Chapter(SQLModel, table=True):
     # - completed: Both parts are finished
     # - failed: An error occurred during generation
     status: str = Field(default="draft")
-    content: Optional[str] = Field(default=None, sa_column=Column(Text))
+    # Bodies (see CHAPTER_BODY_COLUMNS) are stored compressed and are not
+    # loaded with the chapter list of a book
+    content: Optional[str] = Field(default=None, sa_column=Column(CompressedText))
+    # Checkpoint of the part currently being written (writing_part1/writing_part2)
+    partial_content: Optional[str] = Field(default=None, sa_column=Column(CompressedText))
+    # Rendered HTML of `content`, written with it; re-rendered when the renderer version changes
+    content_html: Optional[str] = Field(default=None, sa_column=Column(CompressedText))
+    content_html_version: Optional[int] = None
     user_directives: Optional[str] = Field(default=None, sa_column=Column(Text))
-    previous_storyline: Optional[str] = Field(default=None, sa_column=Column(Text))
+    previous_storyline: Optional[str] = Field(default=None, sa_column=Column(CompressedText))
 
     book_id: Optional[int] = Field(default=None, foreign_key="book.id")
     book: Optional[Book] = Relationship(back_populates="chapters")
 
 
+# Large text columns of a chapter, deferred when only chapter metadata is needed
+CHAPTER_BODY_COLUMNS = (Chapter.content, Chapter.partial_content, Chapter.content_html, Chapter.previous_storyline)
+
+
 class Character(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
@@ -60,5 +83,34 @@ class Character(SQLModel, table=True):
     role_potential: Optional[str] = None
     story_arc: Optional[str] = None
 
+    book_id: Optional[int] = Field(default=None, foreign_key="book.id", index=True)
+    book: Optional[Book] = Relationship(back_populates="characters")
+
+class Job(SQLModel, table=True):
+    """A long-running operation (e.g. book finalization) that runs in the background."""
+    # At most one pending or running job of each kind per book, also across processes
+    __table_args__ = (
+        Index(
+            "ux_job_book_id_kind_active",
+            "book_id",
+            "kind",
+            unique=True,
+            sqlite_where=text("status IN ('pending', 'running')"),
+        ),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str
+    # Status field for background jobs:
+    # - pending: Created, not yet picked up
+    # - running: In progress (resumed on startup if the process died)
+    # - completed: Finished successfully
+    # - failed: Finished with an error
+    status: str = Field(default="pending")
+    # Resumable progress: finished steps and their intermediate results
+    state: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    error: Optional[str] = Field(default=None, sa_column=Column(Text))
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+
     book_id: Optional[int] = Field(default=None, foreign_key="book.id")
-    book: Optional[Book] = Relationship(back_populates="characters")
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+Custom column types.
+
+CompressedText stores long prose compressed while behaving like a plain Text
+column for the rest of the application.
+"""
+import logging
+import zlib
+from typing import Optional, Union
+
+from sqlalchemy.types import Text, TypeDecorator
+
+from app import config
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Compressed values are stored as BLOBs starting with a codec header; values
+# stored as TEXT (short texts, rows written before compression) are plain strings
+ZLIB_HEADER = b"ZL1:"
+ZSTD_HEADER = b"ZS1:"
+
+_zstd_compressor = zstandard.ZstdCompressor(level=10) if zstandard else None
+_zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+_warned_zstd_missing = False
+
+
+def compress_text(text: str, codec: Optional[str]) -> Union[str, bytes]:
+    """Compresses `text` with `codec` ("zlib", "zstd" or None for no compression)."""
+    global _warned_zstd_missing
+    if not codec or len(text) < config.CHAPTER_TEXT_COMPRESSION_MIN_CHARS:
+        return text
+    data = text.encode("utf-8")
+    if codec == "zstd":
+        if _zstd_compressor is not None:
+            return ZSTD_HEADER + _zstd_compressor.compress(data)
+        if not _warned_zstd_missing:
+            logging.warning("zstandard is not installed; compressing chapter text with zlib instead")
+            _warned_zstd_missing = True
+    elif codec != "zlib":
+        raise ValueError(f"Unknown text compression codec: {codec}")
+    return ZLIB_HEADER + zlib.compress(data, 6)
+
+
+def decompress_text(value: Union[str, bytes, None]) -> Optional[str]:
+    """Reverses compress_text; plain strings are returned unchanged."""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    if value.startswith(ZLIB_HEADER):
+        return zlib.decompress(value[len(ZLIB_HEADER):]).decode("utf-8")
+    if value.startswith(ZSTD_HEADER):
+        if _zstd_decompressor is None:
+            raise RuntimeError("Chapter text is zstd-compressed but zstandard is not installed")
+        return _zstd_decompressor.decompress(value[len(ZSTD_HEADER):]).decode("utf-8")
+    # Not written by compress_text
+    return value.decode("utf-8")
+
+
+class CompressedText(TypeDecorator):
+    """
+    A Text column whose values are compressed with CHAPTER_TEXT_COMPRESSION
+    when written. Reads handle compressed and plain values alike, so changing
+    the setting does not require converting existing rows.
+    """
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(value, config.CHAPTER_TEXT_COMPRESSION)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
@@ -93,11 +93,13 @@ class TemplateLoader:
 _loader = TemplateLoader()
 
 # Dynamic template loading function
-def get_template(template_name: str, **kwargs) -> str:
+def get_template(template_name: str, with_footer: bool = True, **kwargs) -> str:
     """Dynamically load a template by name.
     
     Args:
         template_name: Name of the template file (without .md extension)
+        with_footer: Whether to append the language footer (off for prompts
+            that are embedded in another prompt)
         **kwargs: Parameters to format the template with
         
     Returns:
@@ -108,6 +110,8 @@ def get_template(template_name: str, **kwargs) -> str:
     """
     try:
         body = _loader.get_template(template_name, **kwargs)
+        if not with_footer:
+            return body
         footer = _loader.get_template("language_footer", language=get_current_language())
         return f"{body}\n{footer}"
     except FileNotFoundError as e:
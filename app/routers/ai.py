@@ -4,7 +4,11 @@ from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 from fastapi.responses import HTMLResponse
 
-from app.services.ai_service import AIService
+from app.services.ai_service import AIService, get_ai_service
+from app.services.prompt_context import book_context_cache, prompt_context_stats
+from app.services.sse_coalescer import chapter_stream_metrics
+from app.services.vector_store import vector_store_stats
+from app.services.write_queue import write_queue
 
 router = APIRouter()
 
@@ -19,22 +23,35 @@ class CommentRequest(BaseModel):
 
 
 @router.post("/ai/suggest", response_class=HTMLResponse)
-def get_suggestion(
+async def get_suggestion(
     request: SuggestionRequest,
-    ai_service: AIService = Depends(AIService),
+    ai_service: AIService = Depends(get_ai_service),
 ):
     """Generate a creative suggestion for a form field."""
-    suggestion = ai_service.generate_suggestion(
+    suggestion = await ai_service.generate_suggestion(
         context=request.context, field_name=request.field_name
     )
     return suggestion
 
 
 @router.post("/ai/comment", response_class=HTMLResponse)
-def get_comment(
+async def get_comment(
     request: CommentRequest,
-    ai_service: AIService = Depends(AIService),
+    ai_service: AIService = Depends(get_ai_service),
 ):
     """Generate a funny comment."""
-    comment = ai_service.generate_comment(user_input=request.user_input)
-    return comment
\ No newline at end of file
+    comment = await ai_service.generate_comment(user_story_idea=request.user_input)
+    return comment
+
+
+@router.get("/ai/stats")
+async def get_stats(ai_service: AIService = Depends(get_ai_service)):
+    """Runtime counters of the AI service layer (cache hit rates etc.)."""
+    return {
+        **ai_service.stats(),
+        "chapter_streams": chapter_stream_metrics.stats(),
+        "write_queue": write_queue.stats(),
+        "embeddings": vector_store_stats(),
+        "prompt_context": prompt_context_stats.stats(),
+        "book_context_cache": book_context_cache.stats(),
+    }
@@ -7,15 +7,17 @@ from sse_starlette.sse import EventSourceResponse, ServerSentEvent
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
 from app import config
-from app.prompts.templates import get_template
 import json
 
-from app.database import get_session, async_session_maker
+from app.database import get_session
 from app.services.book_service import BookService
+from app.services.chapter_stream import chapter_generations
+from app.services.chapter_writer import has_checkpoint, load_chapter_html, mark_chapter_writing, resume_chapter_generation, start_chapter_generation
+from app.services.sse_coalescer import chapter_stream_metrics, coalesce_chunks
 from app.models.models import Chapter
 from app.utils.i18n import translator
 from app.utils.language import get_language
-from app.utils.text_parser import parse_markdown
+from app.utils.text_parser import MarkdownStreamRenderer
 
 # Configure templates
 templates = Jinja2Templates(directory="app/templates")
@@ -116,7 +118,7 @@ async def get_chapter_view(
         if current_index < len(sorted_chapters) - 1:
             next_chapter_id = sorted_chapters[current_index + 1].id
 
-    formatted_content = parse_markdown(chapter.content) if chapter.content else ""
+    formatted_content = await load_chapter_html(session, chapter)
     
     return templates.TemplateResponse(
         "writing_room.html",
@@ -161,8 +163,8 @@ async def get_chapter_writing_ui(
         if not chapter:
             raise ValueError(f"Chapter with number {chapter_number} not found.")
         
-        # Parse markdown for existing content
-        formatted_content = parse_markdown(chapter.content) if chapter.content else ""
+        # Stored rendering of the existing content
+        formatted_content = await load_chapter_html(session, chapter)
         
         # Return the writing room template
         return templates.TemplateResponse(
@@ -181,68 +183,6 @@ async def get_chapter_writing_ui(
         return HTMLResponse(content=f"Error: {str(e)}", status_code=500)
 
 
-async def finalize_chapter_writing(chapter_id: int, full_content: str, part: int):
-    """Saves the final chapter content and updates status in the background."""
-    session = None
-    try:
-        # It's crucial this task gets its own session
-        session = async_session_maker()
-        chapter = await session.get(Chapter, chapter_id)
-        if chapter:
-            current_chapter_number = chapter.chapter_number
-            if part == 1:
-                chapter.content = full_content + "\n-----\n"
-                chapter.status = "part1_completed"
-            else: # part == 2
-                part1_content = chapter.content or ""
-                chapter.content = part1_content + "\n\n" + full_content
-                chapter.status = "completed"
-            
-            session.add(chapter)
-            await session.commit()
-            logging.info(f"Successfully finalized chapter id {chapter_id}, part {part}.")
-
-            # generate a summary of the storyline so far
-            if part == 2:
-                book_service = BookService(session)
-                book = await book_service.get_book(chapter.book_id)
-                previous_storyline = ""
-                next_chapter_synopsis = ""
-                for ch in book.chapters:
-                    # get previous summary for consistency
-                    if ch.chapter_number == current_chapter_number - 1 and ch.previous_storyline:
-                        previous_storyline += ch.previous_storyline
-                    elif ch.chapter_number == current_chapter_number - 1 and not ch.previous_storyline:
-                        previous_storyline += ch.content
-                    # for the current chapter, use the actual full content
-                    elif ch.chapter_number == current_chapter_number:
-                        previous_storyline += ch.content
-                    # the next chapter, if it exists, for context
-                    elif ch.chapter_number == current_chapter_number + 1:
-                        next_chapter_synopsis = ch.synopsis
-                
-                # call the LLM to create a summary of the storyline so far
-                if previous_storyline and next_chapter_synopsis:
-                    storyline_synopsis = await book_service.ai_service.generate_response(
-                        get_template("create_summary",
-                                    previous_storyline=previous_storyline,
-                                    next_chapter_synopsis=next_chapter_synopsis)
-                    )
-                    if storyline_synopsis:
-                        chapter.previous_storyline = storyline_synopsis
-                        session.add(chapter)
-                        await session.commit()
-                        logging.info(f"Successfully generated storyline synopsis for chapter id {chapter_id}.")
-                    else:
-                        logging.error(f"Failed to generate storyline synopsis for chapter id {chapter_id}.")
-
-    except Exception as e:
-        logging.error(f"Background finalization failed for chapter id {chapter_id}: {e}", exc_info=True)
-    finally:
-        if session:
-            await session.close()
-
-
 @router.post("/book/{book_id}/chapter/{chapter_id}/generate")
 async def generate_chapter(
     request: Request,
@@ -265,11 +205,7 @@ async def generate_chapter(
         if not chapter:
             return HTMLResponse("Chapter not found", status_code=404)
 
-        chapter.status = f"writing_part{part}"
-        chapter.user_directives = user_directives
-        session.add(chapter)
-        await session.commit()
-        await session.refresh(chapter)
+        await mark_chapter_writing(chapter, part, user_directives)
 
         prompt = await book_service.build_chapter_prompt(chapter, part, user_directives)
         
@@ -294,85 +230,119 @@ async def generate_chapter_stream(
     chapter_number: int,
     part: int = Query(...),
     user_directives: str = Query(""),
+    attach: bool = Query(False),
+    last_event_id: Optional[str] = Header(None),
     session: AsyncSession = Depends(get_session),
 ):
     """
     SSE endpoint for streaming chapter generation.
+
+    There is only one generation per chapter part: further clients (a second
+    tab, a reconnect) attach to it, replay what was produced so far, and then
+    follow live. Event ids are the generation's epoch and the chunk sequence
+    number, so a client reconnecting with Last-Event-ID only receives what it
+    missed; an id from an earlier generation (e.g. before a restart) gets a
+    `reset` event and a full replay. With `attach` set, or on a reconnect, the
+    endpoint never starts a new generation: an interrupted part is resumed
+    from its checkpoint, otherwise an `idle` event is sent.
+
+    `message` events carry the raw text; each completed paragraph is also sent
+    rendered as a `paragraph` event.
     """
     logging.info(f"Starting SSE streaming for book_id={book_id}, chapter_number={chapter_number}, part={part}")
+    chapter_id = None
     
     try:
         book_service = BookService(session)
         
-        # Get the chapter
-        # find chapter by chapter_number
-        chapter = None
-        book = await book_service.get_book(book_id)
-        for ch in book.chapters:
-            if ch.chapter_number == chapter_number:
-                chapter = ch
-                chapter_id = ch.id
-                break
+        # Only the chapter itself is loaded; the prompt loads its own context
+        chapter = await book_service.get_chapter_by_number(book_id, chapter_number)
         if not chapter:
             logging.error(f"Chapter number {chapter_number} not found")
             return HTMLResponse("Chapter number not found", status_code=404)
+        chapter_id = chapter.id
 
-        # Update chapter status
-        chapter.status = f"writing_part{part}"
-        chapter.user_directives = user_directives
-        session.add(chapter)
-        await session.commit()
-        await session.refresh(chapter)
+        generation = chapter_generations.get(chapter_id, part)
+        # EventSource reconnects to the original URL with Last-Event-ID
+        reconnecting = last_event_id is not None
+        if generation is None or (generation.done and not reconnecting):
+            if attach or reconnecting:
+                # A reconnect never starts a generation: it follows the part
+                # again from its checkpoint if it was interrupted, or is told
+                # that nothing is running. The checkpoint is never cleared here.
+                generation = None
+                if (
+                    config.CHAPTER_RECOVERY_ON_STARTUP
+                    and chapter.status == f"writing_part{part}"
+                    and has_checkpoint(chapter)
+                ):
+                    generation = await resume_chapter_generation(book_service, chapter)
+            else:
+                # Update chapter status
+                await mark_chapter_writing(chapter, part, user_directives)
 
-        # Build the prompt
-        prompt = await book_service.build_chapter_prompt(chapter, part, user_directives)
-        logging.info(f"Successfully built prompt for chapter id {chapter_id} (book_id={book_id}, chapter_number={chapter_number})")
+                # Build the prompt
+                prompt = await book_service.build_chapter_prompt(chapter, part, user_directives)
+                logging.info(f"Successfully built prompt for chapter id {chapter_id} (book_id={book_id}, chapter_number={chapter_number})")
+
+                generation = start_chapter_generation(book_service, chapter, part, prompt)
+                last_event_id = None
+
+        # Ids from an earlier generation of the part number different text
+        start = generation.resume_position(last_event_id) if generation is not None else 0
+        replay = start is None
+        if replay:
+            start = 0
 
         async def stream_wrapper():
-            streaming_session = None
+            if generation is None:
+                yield ServerSentEvent(
+                    data="No generation in progress.",
+                    event="idle",
+                )
+                return
+            # Tokens are merged into larger frames; a frame's id is its last chunk
+            stream_id, metrics = chapter_stream_metrics.open(f"chapter {chapter_id}, part {part}")
             try:
-                streaming_session = async_session_maker()
-                logging.info(f"Created new session for streaming chapter id {chapter_id} (book_id={book_id}, chapter_number={chapter_number})")
-                
-                full_content = ""
-                try:
-                    logging.info(f"Starting AI streaming for chapter id {chapter_id} (book_id={book_id}, chapter_number={chapter_number})")
-                    streaming_book_service = BookService(streaming_session)
-                    
-                    async for chunk in streaming_book_service.ai_service.generate_response_stream(prompt):
-                        content = chunk.get("data", "")
-                        full_content += content
-                        logging.debug(f"Streaming chunk: {content}")
-                        
-                        yield ServerSentEvent(
-                            data=content,
-                            event="message",
-                            id=str(chapter_id)
-                        )
-                    
-                    logging.info(f"AI streaming completed for chapter id {chapter_id} (book_id={book_id}, chapter_number={chapter_number}), content length: {len(full_content)}")
-                    
-                    # Call finalization directly since we can't use BackgroundTasks in GET
-                    # We'll do this in a separate task to avoid blocking the response
-                    import asyncio
-                    asyncio.create_task(finalize_chapter_writing(chapter_id, full_content, part))
-
+                if replay:
+                    # The client discards what it streamed and gets everything again
+                    yield ServerSentEvent(data="Replaying the generation.", event="reset")
+                frames = coalesce_chunks(
+                    generation.subscribe(start),
+                    max_bytes=config.SSE_COALESCE_MAX_BYTES,
+                    max_delay=config.SSE_COALESCE_MAX_DELAY_MS / 1000,
+                    metrics=metrics,
+                )
+                # Finished paragraphs are also sent as HTML so the page can show them formatted
+                renderer = MarkdownStreamRenderer()
+                if start > 0:
+                    renderer.feed("".join(generation.stream.items[:start]))
+                async for seq, content in frames:
                     yield ServerSentEvent(
-                        data="Stream finished.",
-                        event="complete",
-                        id=str(chapter_id)
-                    )
-                except Exception as e:
-                    logging.error(f"Streaming failed for chapter id {chapter_id} (book_id={book_id}, chapter_number={chapter_number}): {e}", exc_info=True)
-                    yield ServerSentEvent(
-                        data="An error occurred during streaming.",
-                        event="error",
-                        id=str(chapter_id)
+                        data=content,
+                        event="message",
+                        id=generation.event_id(seq)
                     )
+                    paragraphs_html = renderer.feed(content)
+                    if paragraphs_html:
+                        yield ServerSentEvent(data=paragraphs_html, event="paragraph")
+
+                paragraphs_html = renderer.flush()
+                if paragraphs_html:
+                    yield ServerSentEvent(data=paragraphs_html, event="paragraph")
+                yield ServerSentEvent(
+                    data="Stream finished.",
+                    event="complete",
+                    id=generation.event_id(len(generation.stream.items))
+                )
+            except Exception as e:
+                logging.error(f"Streaming failed for chapter id {chapter_id} (book_id={book_id}, chapter_number={chapter_number}): {e}", exc_info=True)
+                yield ServerSentEvent(
+                    data="An error occurred during streaming.",
+                    event="error",
+                )
             finally:
-                if streaming_session:
-                    await streaming_session.close()
-                    logging.info(f"Closed streaming session for chapter {chapter_id}")
+                chapter_stream_metrics.close(stream_id)
 
         headers = {
             "Cache-Control": "no-cache, no-store, must-revalidate",
@@ -387,4 +357,25 @@ async def generate_chapter_stream(
         
     except Exception as e:
         logging.error(f"Error in generate_chapter_stream for chapter {chapter_id}: {e}", exc_info=True)
-        raise
\ No newline at end of file
+        raise
+
+
+@router.post("/book/{book_id}/chapter/{chapter_number}/resume")
+async def resume_chapter(
+    book_id: int,
+    chapter_number: int,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Continues an interrupted chapter from its last checkpoint. The client then
+    follows the generation through the stream endpoint with `attach` set.
+    """
+    book_service = BookService(session)
+    chapter = await book_service.get_chapter_by_number(book_id, chapter_number)
+    if not chapter:
+        return HTMLResponse("Chapter number not found", status_code=404)
+
+    generation = await resume_chapter_generation(book_service, chapter)
+    if generation is None:
+        return HTMLResponse("Chapter is not being written", status_code=409)
+    return HTMLResponse(content="", status_code=202)
@@ -8,8 +8,9 @@ from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
 from app import config
 import json
+from urllib.parse import urlencode
 
-from app.database import get_session, async_session_maker
+from app.database import get_read_session, get_session, async_session_maker
 from app.services.book_service import BookService
 from app.models.models import Chapter
 from app.utils.i18n import translator
@@ -51,24 +52,31 @@ async def get_root(request: Request, lang: str = Depends(get_language)):
 async def get_bookshelf(
     request: Request,
     status: Optional[List[str]] = Query(None),
-    session: AsyncSession = Depends(get_session),
+    cursor: Optional[str] = Query(None),
+    session: AsyncSession = Depends(get_read_session),
     lang: str = Depends(get_language)
 ):
     """
-    Renders the bookshelf partial, filtering books by status.
+    Renders the bookshelf partial, filtering books by status. With a cursor,
+    only the next page of books is rendered (for infinite scrolling).
     """
     if status is None:
         status = ["active"]  # Default to 'active' books
 
     book_service = BookService(session)
-    books = await book_service.get_books(statuses=status)
+    try:
+        books, next_cursor = await book_service.get_bookshelf(statuses=status, cursor=cursor)
+    except ValueError as e:
+        return HTMLResponse(content=str(e), status_code=400)
     _ = translator.get_translator(lang)
 
     return templates.TemplateResponse(
-        "_bookshelf.html",
+        "_bookshelf_items.html" if cursor else "_bookshelf.html",
         {
             "request": request,
             "books": books,
+            "next_cursor": next_cursor,
+            "next_page_query": urlencode([("status", s) for s in status] + [("cursor", next_cursor or "")]),
             "_": _,
             "lang": lang,
             "available_languages": translator.available_languages,
@@ -1,5 +1,4 @@
 # app/routers/wizard.py
-import logging
 from typing import List, Optional
 from fastapi import APIRouter, Request, Depends, Form, Header, Query, Response, status, BackgroundTasks
 from fastapi.responses import HTMLResponse, RedirectResponse
@@ -7,10 +6,12 @@ from sse_starlette.sse import EventSourceResponse, ServerSentEvent
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
 from app import config
+import html
 import json
 
 from app.database import get_session, async_session_maker
 from app.services.book_service import BookService
+from app.services.job_service import job_manager
 from app.models.models import Chapter
 from app.utils.i18n import translator
 from app.utils.language import get_language
@@ -334,42 +335,70 @@ async def save_chapters(
 async def generate_book(
     request: Request,
     book_id: int,
-    session: AsyncSession = Depends(get_session),
     lang: str = Depends(get_language),
 ):
     """
-    Finalizes and generates the book, then returns a redirect response
-    for HTMX or an error partial.
+    Starts finalizing the book as a background job and returns the progress
+    partial, which follows the job over SSE.
     """
-    book_service = BookService(session=session)
+    job = await job_manager.start_finalize_book(book_id=book_id)
+    _ = translator.get_translator(lang)
+
+    return templates.TemplateResponse(
+        "wizard/_generation_progress.html",
+        {
+            "request": request,
+            "book_id": book_id,
+            "job": job,
+            "_": _,
+            "lang": lang,
+        },
+    )
+
+
+def _render_progress_event(event: dict, _) -> str:
+    """Renders a finalization progress event as a list item."""
+    params = {key: value for key, value in event.items() if key != "step"}
+    message = _(f"progress_{event['step']}")
     try:
-        await book_service.finalize_and_generate_book(book_id=book_id)
-        
-        # On success, redirect
-        return HTMLResponse(
-            content="",
-            status_code=200,
-            headers={"HX-Redirect": f"/book/{book_id}"},
-        )
-    except Exception as e:
-        logging.error(f"Error generating book {book_id}: {e}", exc_info=True)
-        
-        # Mark book as failed
-        await book_service.update_book_status(book_id, "failed")
-        
-        # Re-fetch the book to pass to the template
-        book = await book_service.get_book(book_id)
-
-        # Return error partial
-        _ = translator.get_translator(lang)
-        return templates.TemplateResponse(
-            "wizard/_error.html",
-            {
-                "request": request,
-                "book": book,
-                "_": _,
-                "lang": lang,
-                "error_details": str(e)
-            },
-            status_code=500
-        )
\ No newline at end of file
+        message = message.format(**params)
+    except (KeyError, IndexError, ValueError):
+        pass
+    return f"<li>{html.escape(message)}</li>"
+
+
+@router.get("/book/{book_id}/generate/events")
+async def generate_book_events(
+    request: Request,
+    book_id: int,
+    lang: str = Depends(get_language),
+):
+    """
+    SSE endpoint reporting the progress of the book's finalization job.
+    """
+    job = await job_manager.get_latest_job(book_id)
+    if not job:
+        return HTMLResponse("No generation job found", status_code=404)
+    _ = translator.get_translator(lang)
+
+    async def event_stream():
+        async for event in job_manager.subscribe(job):
+            if event["step"] == "completed":
+                yield ServerSentEvent(data=f"/book/{book_id}", event="complete")
+                return
+            if event["step"] == "failed":
+                # The request's session is closed once the response starts streaming
+                async with async_session_maker() as session:
+                    book = await BookService(session).get_book(book_id)
+                    error_html = templates.get_template("wizard/_error.html").render(
+                        {"request": request, "book": book, "_": _, "lang": lang, "error_details": event.get("error", "")}
+                    )
+                yield ServerSentEvent(data=error_html, event="failed")
+                return
+            yield ServerSentEvent(data=_render_progress_event(event, _), event="progress")
+
+    headers = {
+        "Cache-Control": "no-cache, no-store, must-revalidate",
+        "X-Accel-Buffering": "no",
+    }
+    return EventSourceResponse(event_stream(), headers=headers)
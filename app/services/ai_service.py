@@ -1,13 +1,22 @@
 """AI/LLM integration service."""
 
 import json
+import logging
+import time
 from typing import Optional, Type, TypeVar, AsyncGenerator
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel
 
 from app import config
 from app.prompts.templates import get_template
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_client import llm_clients
+from app.services.llm_scheduler import (
+    LLMScheduler,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_STREAMING,
+)
+from app.services.single_flight import SingleFlight
 
 T = TypeVar("T", bound=BaseModel)
 
@@ -16,33 +25,98 @@ class AIService:
     """Service for AI/LLM interactions."""
 
     def __init__(self):
-        self.model = ChatOpenAI(
-            model=config.LLM_MODEL,
-            temperature=1,
-            api_key=config.OPENAI_API_KEY,
-            base_url=config.OPENAI_API_BASE,
-            streaming=True,
+        # The chat model and its connection pool are shared process-wide
+        self.model = llm_clients.get_chat_model(temperature=1)
+        self.cache = None
+        if config.LLM_CACHE_ENABLED:
+            self.cache = LLMResponseCache(
+                max_entries=config.LLM_CACHE_MAX_ENTRIES,
+                ttl_seconds=config.LLM_CACHE_TTL_SECONDS,
+                sqlite_path=config.LLM_CACHE_SQLITE_PATH,
+                sqlite_max_entries=config.LLM_CACHE_SQLITE_MAX_ENTRIES,
+            )
+        # Identical prompts that are already in flight are awaited, not re-sent
+        self.single_flight = SingleFlight()
+        # Admission control so interactive calls are not stuck behind long streams
+        self.scheduler = LLMScheduler(
+            max_concurrency=config.LLM_MAX_CONCURRENCY,
+            reserved_interactive_slots=config.LLM_RESERVED_INTERACTIVE_SLOTS,
         )
 
-    async def generate_response(self, prompt_text: str, model: Optional[Type[T]] = None) -> T | str:
+    def _cache_key(self, prompt_text: str, template_name: Optional[str]) -> str:
+        return LLMResponseCache.make_key(
+            template_name, prompt_text, self.model.model_name, self.model.temperature
+        )
+
+    async def generate_response(
+        self,
+        prompt_text: str,
+        model: Optional[Type[T]] = None,
+        *,
+        template_name: Optional[str] = None,
+        use_cache: bool = True,
+        priority: str = PRIORITY_INTERACTIVE,
+        book_id: Optional[int] = None,
+    ) -> T | str:
         """
         Generate a response using the AI model, with optional structured output.
+
+        Plain text responses are served from the response cache when an identical
+        call was made before; pass use_cache=False for calls that must be fresh.
+        Structured responses are never cached. `priority` and `book_id` decide
+        when the call gets a backend slot (see LLMScheduler).
         """
         if model:
-            structured_llm = self.model.with_structured_output(model)
-            result = await structured_llm.ainvoke(prompt_text)
-            return result
-        else:
-            result = await self.model.ainvoke(prompt_text)
+            async def invoke_structured():
+                structured_llm = self.model.with_structured_output(model)
+                async with self.scheduler.slot(priority, book_id):
+                    return await structured_llm.ainvoke(prompt_text)
+
+            flight_key = self._cache_key(prompt_text, f"{template_name}:{model.__name__}")
+            return await self.single_flight.do(flight_key, invoke_structured)
+
+        cache_key = self._cache_key(prompt_text, template_name)
+        if use_cache and self.cache is not None:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                logging.info(f"LLM cache hit for template '{template_name}'")
+                return cached
+
+        async def invoke():
+            async with self.scheduler.slot(priority, book_id):
+                started = time.monotonic()
+                result = await self.model.ainvoke(prompt_text)
+            if use_cache and self.cache is not None and result.content:
+                await self.cache.set(cache_key, result.content, generation_seconds=time.monotonic() - started)
             return result.content
 
-    async def generate_response_stream(self, prompt_text: str) -> AsyncGenerator[dict, None]:
+        # A fresh call must not join a flight that may have been answered before it started
+        flight_key = cache_key if use_cache else f"{cache_key}:fresh"
+        return await self.single_flight.do(flight_key, invoke)
+
+    async def generate_response_stream(
+        self,
+        prompt_text: str,
+        *,
+        priority: str = PRIORITY_STREAMING,
+        book_id: Optional[int] = None,
+    ) -> AsyncGenerator[dict, None]:
         """
         Generate a response using the AI model, yielding content chunks.
+
+        A caller asking for a prompt that is already streaming attaches to the
+        running upstream stream and receives all chunks from the beginning.
+        The backend slot is held until the stream ends.
         """
-        async for chunk in self.model.astream(prompt_text):
-            if hasattr(chunk, "content") and chunk.content:
-                yield {"data": chunk.content}
+        async def stream():
+            async with self.scheduler.slot(priority, book_id):
+                async for chunk in self.model.astream(prompt_text):
+                    if hasattr(chunk, "content") and chunk.content:
+                        yield {"data": chunk.content}
+
+        flight_key = self._cache_key(prompt_text, "stream")
+        async for item in self.single_flight.stream(flight_key, stream):
+            yield item
 
     async def generate_comment(self, user_story_idea: str,
             user_book_title: str = "Not defined yet",
@@ -54,9 +128,42 @@ class AIService:
             user_book_title=user_book_title,
             user_world_description=user_world_description,
             user_characters=user_characters )
-        return await self.generate_response(prompt)
+        return await self.generate_response(prompt, template_name="funny_comment")
 
     async def generate_suggestion(self, context: str, field_name: str) -> str:
         """Generate a creative suggestion for a field."""
         prompt = get_template("field_suggestion", context=context, field_name=field_name)
-        return await self.generate_response(prompt)
\ No newline at end of file
+        # A repeated request for a suggestion asks for a new idea, so skip the cache
+        return await self.generate_response(prompt, template_name="field_suggestion", use_cache=False)
+
+    def stats(self) -> dict:
+        """Runtime counters for the AI service layer."""
+        return {
+            "llm_cache": self.cache.stats() if self.cache else None,
+            "single_flight": self.single_flight.stats(),
+            "scheduler": self.scheduler.stats(),
+        }
+
+    def close(self) -> None:
+        """Releases resources held by the service."""
+        if self.cache is not None:
+            self.cache.close()
+
+
+_ai_service: Optional[AIService] = None
+
+
+def get_ai_service() -> AIService:
+    """Returns the shared AIService instance (also usable as a FastAPI dependency)."""
+    global _ai_service
+    if _ai_service is None:
+        _ai_service = AIService()
+    return _ai_service
+
+
+def reset_ai_service() -> None:
+    """Drops the shared AIService so it is rebuilt against fresh clients."""
+    global _ai_service
+    if _ai_service is not None:
+        _ai_service.close()
+    _ai_service = None
@@ -0,0 +1,47 @@
+"""Tracking of fire-and-forget tasks so they can be awaited on shutdown."""
+
+import asyncio
+import logging
+from typing import Coroutine, Optional, Set
+
+
+class TaskTracker:
+    """
+    Keeps references to background tasks (so they are not garbage collected
+    mid-flight), logs their failures, and lets shutdown wait for them.
+    """
+
+    def __init__(self):
+        self._tasks: Set[asyncio.Task] = set()
+
+    def spawn(self, coro: Coroutine, name: Optional[str] = None) -> asyncio.Task:
+        """Runs `coro` as a tracked task."""
+        task = asyncio.create_task(coro, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._on_done)
+        return task
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Background task {task.get_name()} failed: {task.exception()}", exc_info=task.exception())
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """Waits for all tracked tasks; cancels whatever is left after `timeout`."""
+        if not self._tasks:
+            return
+        logging.info(f"Waiting for {len(self._tasks)} background task(s) to finish")
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        if pending:
+            logging.warning(f"Cancelling {len(pending)} background task(s) still running after {timeout}s")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+# Global instance
+task_tracker = TaskTracker()
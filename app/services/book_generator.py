@@ -1,11 +1,12 @@
 """Book generation logic and orchestration."""
 
 import json
-from typing import AsyncGenerator, TYPE_CHECKING
+from typing import AsyncGenerator, Optional, TYPE_CHECKING
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
-from app.services.ai_service import AIService
-from app.services.vector_store import VectorStoreService
+from app.services.ai_service import AIService, get_ai_service
+from app.services.llm_scheduler import PRIORITY_BACKGROUND
+from app.services.vector_store import VectorStoreService, get_vector_store
 from app.prompts.templates import get_template
 from app import config
 from app.models.data_models import BookConcept, CharacterCollection
@@ -19,8 +20,16 @@ class BookGenerator:
     """Main service for book generation operations."""
     
     def __init__(self, ai_service: AIService = None):
-        self.ai_service = ai_service if ai_service else AIService()
-        self.vector_store = VectorStoreService()
+        self.ai_service = ai_service if ai_service else get_ai_service()
+
+    @property
+    def vector_store(self) -> Optional[VectorStoreService]:
+        """The shared vector store, opened on first access (None if disabled)."""
+        return get_vector_store()
+
+    def _get_character_context(self) -> str:
+        vector_store = self.vector_store
+        return vector_store.get_character_context() if vector_store else ""
     
     async def generate_initial_concept(
         self,
@@ -29,7 +38,7 @@ class BookGenerator:
         story_bits: str = config.DEFAULT_STORY_BITS
     ) -> str:
         """Generate initial book concept."""
-        characters_to_use = self.vector_store.get_character_context()
+        characters_to_use = self._get_character_context()
         
         return await self.ai_service.generate_response(
             get_template("initial_concept",
@@ -58,7 +67,10 @@ class BookGenerator:
                                 story_bits=book.user_prompt,
                                 characters_to_use=characters_to_use)
 
-        return await self.ai_service.generate_response(prompt, model=BookConcept)
+        return await self.ai_service.generate_response(
+            prompt, model=BookConcept, template_name="initial_concept",
+            priority=PRIORITY_BACKGROUND, book_id=book.id
+        )
 
     async def generate_character_sheet(
         self,
@@ -73,7 +85,10 @@ class BookGenerator:
                         is_protagonist=character.is_protagonist,
                         world_params=world_params,
                         story_bits=story_bits)
-        return await self.ai_service.generate_response(prompt, model=Character)
+        return await self.ai_service.generate_response(
+            prompt, model=Character, template_name="character_sheet",
+            priority=PRIORITY_BACKGROUND, book_id=character.book_id
+        )
     
     async def generate_events(
         self,
@@ -83,7 +98,7 @@ class BookGenerator:
         story_bits: str = config.DEFAULT_STORY_BITS
     ) -> str:
         """Generate events for a chapter."""
-        characters_to_use = self.vector_store.get_character_context()
+        characters_to_use = self._get_character_context()
         
         return await self.ai_service.generate_response(
             get_template("create_events",
@@ -136,4 +151,7 @@ class BookGenerator:
     
     def setup_characters(self, characters: CharacterCollection) -> None:
         """Setup character embeddings in vector store."""
-        self.vector_store.embed_characters(characters)
\ No newline at end of file
+        vector_store = self.vector_store
+        if vector_store is None:
+            return
+        vector_store.embed_characters(characters)
\ No newline at end of file
@@ -1,23 +1,79 @@
 # app/services/book_service.py
-import json
-from typing import List, Optional
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional, Tuple
 from sqlmodel import Session, select
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy.orm import selectinload
-from sqlalchemy import delete
-from app.models.models import Book, Character, Chapter
-from app.services.ai_service import AIService
+from sqlalchemy.orm import defer, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import config
+from app.models.models import Book, Character, Chapter, CHAPTER_BODY_COLUMNS
+from app.models.data_models import BookshelfEntry, ChapterPromptContext
+from app.services.ai_service import get_ai_service
 from app.services.book_generator import BookGenerator
+from app.services.prompt_context import (
+    BookPromptContext,
+    book_context_cache,
+    render_character_context,
+    score_characters,
+    select_characters,
+)
+from app.services.vector_store import get_vector_store
 from app.prompts.templates import get_template
+from app.utils.text_parser import estimate_tokens
 import logging
 
+# Awaited with a step name and step data while a book is being finalized
+ProgressCallback = Callable[..., Awaitable[None]]
+# Book columns that chapter prompts are built from; changing them bumps Book.version
+BOOK_CONTEXT_FIELDS = {"user_prompt", "world_description", "llm_concept"}
+
+
+def _chapters_without_bodies():
+    """Loads a book's chapters without their (large, compressed) text columns."""
+    return selectinload(Book.chapters).options(*(defer(column) for column in CHAPTER_BODY_COLUMNS))
+
+
 class BookService:
     def __init__(self, session: AsyncSession):
         self.session = session
-        # Instantiate AIService and BookGenerator
-        self.ai_service = AIService()
+        # Share the process-wide AIService (and its pooled LLM client)
+        self.ai_service = get_ai_service()
         self.book_generator = BookGenerator(ai_service=self.ai_service)
 
+    async def _bulk_insert(self, model, rows: List[dict], conflict_columns: Optional[List[str]] = None) -> list:
+        """
+        Inserts `rows` of `model` in one multi-row INSERT and returns the new
+        objects. With `conflict_columns`, rows that would violate that unique
+        index are skipped (and not returned).
+        """
+        if not rows:
+            return []
+        statement = sqlite_insert(model)
+        if conflict_columns:
+            statement = statement.on_conflict_do_nothing(index_elements=conflict_columns)
+        result = await self.session.scalars(statement.returning(model), rows)
+        return list(result.all())
+
+    async def _insert_chapters(self, book_id: int, chapters_data: List[dict]) -> List[Chapter]:
+        """
+        Inserts draft chapters, skipping chapter numbers the book already has.
+        The unique (book_id, chapter_number) index makes this safe when two
+        requests materialize the same book at once.
+        """
+        rows = [{**chapter_data, "status": "draft", "book_id": book_id} for chapter_data in chapters_data]
+        chapters = await self._bulk_insert(Chapter, rows, conflict_columns=["book_id", "chapter_number"])
+        if len(chapters) < len(rows):
+            # Also hides chapter numbers that the concept itself repeats
+            inserted = [chapter.chapter_number for chapter in chapters]
+            skipped = [row["chapter_number"] for row in rows]
+            for chapter_number in inserted:
+                skipped.remove(chapter_number)
+            logging.warning(f"Skipped {len(skipped)} chapter(s) of book {book_id} with existing numbers: {skipped}")
+        return chapters
+
     async def _create_chapters_from_concept(self, book: "Book") -> None:
         """
         Creates Chapter objects from the book's LLM concept data.
@@ -26,30 +82,30 @@ class BookService:
         # Get the chapter list from the book's LLM concept
         chapters_data = book.llm_concept.get("chapters", [])
         
-        # Create Chapter objects for each conceptual chapter
-        for chapter_data in chapters_data:
-            chapter = Chapter(
-                chapter_number=chapter_data.get("chapter_number", 1),
-                title=chapter_data.get("chapter_title", "Untitled Chapter"),
-                synopsis=chapter_data.get("chapter_synopsis", ""),
-                status="draft",
-                book_id=book.id
-            )
-            self.session.add(chapter)
+        # Create a chapter row for each conceptual chapter
+        await self._insert_chapters(book.id, [
+            {
+                "chapter_number": chapter_data.get("chapter_number", 1),
+                "title": chapter_data.get("chapter_title", "Untitled Chapter"),
+                "synopsis": chapter_data.get("chapter_synopsis", ""),
+            }
+            for chapter_data in chapters_data
+        ])
         
         # Commit all the new chapters to the database
         await self.session.commit()
 
     async def get_book(self, book_id: int) -> "Book":
         """
-        Retrieves a book by its ID.
+        Retrieves a book by its ID. The text of its chapters is not loaded;
+        use get_chapter_by_number or refresh a chapter's body columns to read it.
         """
         logging.info(f"Retrieving book {book_id}")
         
         try:
             query = select(Book).where(Book.id == book_id).options(
                 selectinload(Book.characters),
-                selectinload(Book.chapters)
+                _chapters_without_bodies()
             )
             result = await self.session.execute(query)
             book = result.scalar_one_or_none()
@@ -67,10 +123,11 @@ class BookService:
                 await self._create_chapters_from_concept(book)
                 
                 # Re-fetch the book to load the newly created chapters relationship
+                # (the rows were inserted without going through the ORM)
                 query = select(Book).where(Book.id == book_id).options(
                     selectinload(Book.characters),
-                    selectinload(Book.chapters)
-                )
+                    _chapters_without_bodies()
+                ).execution_options(populate_existing=True)
                 result = await self.session.execute(query)
                 book = result.scalar_one_or_none()
                 logging.info(f"Re-fetched book {book_id} after creating chapters")
@@ -81,22 +138,70 @@ class BookService:
             logging.error(f"Error retrieving book {book_id}: {e}", exc_info=True)
             raise
 
-    async def get_books(self, statuses: Optional[List[str]] = None) -> List[Book]:
+    async def get_bookshelf(
+        self,
+        statuses: Optional[List[str]] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[List[BookshelfEntry], Optional[str]]:
         """
-        Retrieves books, optionally filtered by status, ordered by creation date.
+        Retrieves one page of the bookshelf, newest first. Only the shelf
+        columns are selected; chapter and character counts are computed in SQL.
+        Pages are keyed on (created_at, id): pass the returned cursor to get the
+        next page. The cursor is None once there are no more books.
         """
-        query = select(Book).options(
-            selectinload(Book.characters),
-            selectinload(Book.chapters)
-        ).order_by(Book.created_at.desc())
+        limit = limit or config.BOOKSHELF_PAGE_SIZE
+        chapters_total = (
+            select(func.count(Chapter.id)).where(Chapter.book_id == Book.id).scalar_subquery()
+        )
+        chapters_completed = (
+            select(func.count(Chapter.id))
+            .where(Chapter.book_id == Book.id, Chapter.status == "completed")
+            .scalar_subquery()
+        )
+        characters_count = (
+            select(func.count(Character.id)).where(Character.book_id == Book.id).scalar_subquery()
+        )
+        query = select(
+            Book.id,
+            Book.title,
+            Book.status,
+            Book.created_at,
+            chapters_total.label("chapters_total"),
+            chapters_completed.label("chapters_completed"),
+            characters_count.label("characters_count"),
+        ).order_by(Book.created_at.desc(), Book.id.desc())
+
         if statuses:
+            statuses = list(statuses)
             if "draft" in statuses:
                 statuses.append("failed")
             query = query.where(Book.status.in_(statuses))
-        
-        result = await self.session.execute(query)
-        books = result.scalars().all()
-        return books
+
+        if cursor:
+            created_at, book_id = self._decode_bookshelf_cursor(cursor)
+            query = query.where(
+                (Book.created_at < created_at) | ((Book.created_at == created_at) & (Book.id < book_id))
+            )
+
+        # One extra row tells whether there is a next page
+        result = await self.session.execute(query.limit(limit + 1))
+        rows = result.all()
+        entries = [BookshelfEntry(**row._mapping) for row in rows[:limit]]
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = entries[-1]
+            next_cursor = f"{last.created_at.isoformat()}_{last.id}"
+        return entries, next_cursor
+
+    @staticmethod
+    def _decode_bookshelf_cursor(cursor: str) -> Tuple[datetime, int]:
+        try:
+            created_at, book_id = cursor.rsplit("_", 1)
+            return datetime.fromisoformat(created_at), int(book_id)
+        except ValueError:
+            raise ValueError(f"Invalid bookshelf cursor: {cursor}")
 
     async def delete_book(self, book_id: int) -> None:
         """
@@ -108,6 +213,10 @@ class BookService:
             await self.session.delete(book)
             await self.session.commit()
             logging.info(f"Deleted book {book_id}")
+            book_context_cache.invalidate(book_id)
+            vector_store = get_vector_store()
+            if vector_store is not None:
+                await asyncio.to_thread(vector_store.delete_book, book_id)
         else:
             logging.error(f"Book {book_id} not found")
 
@@ -126,9 +235,14 @@ class BookService:
         Updates a book with the given attributes.
         """
         book = await self.get_book(book_id)
+        changed_context = False
         for key, value in kwargs.items():
             if hasattr(book, key) and value is not None:
+                if key in BOOK_CONTEXT_FIELDS and getattr(book, key) != value:
+                    changed_context = True
                 setattr(book, key, value)
+        if changed_context:
+            book.version += 1
         
         self.session.add(book)
         await self.session.commit()
@@ -150,61 +264,144 @@ class BookService:
         """
         Saves character data for a specific book.
         """
-        # Delete all existing characters for the book using proper SQLAlchemy delete
-        delete_query = delete(Character).where(Character.book_id == book_id)
-        await self.session.execute(delete_query)
-        await self.session.commit()  # Commit the deletions first
-        
-        # Clear the session to remove references to deleted objects
-        self.session.expunge_all()
+        await self.replace_characters(book_id, characters_data)
 
-        # Re-fetch the book after deletion to get a clean state
-        book = await self.get_book(book_id)
-        
+    async def replace_characters(self, book_id: int, characters_data: list[dict]) -> List[Character]:
+        """
+        Replaces all characters of a book in a single transaction: one DELETE
+        and one multi-row INSERT. Returns the new characters; a loaded Book
+        object in this session gets them as its `characters` as well.
+        """
         # Simple validation: Ensure only one protagonist
         protagonist_count = sum(1 for char in characters_data if char.get('is_protagonist'))
         if protagonist_count != 1:
             raise ValueError("There must be exactly one protagonist.")
 
-        for char_data in characters_data:
-            character = Character(
-                name=char_data['name'],
-                description=char_data['description'],
-                is_protagonist=char_data.get('is_protagonist', False),
-                book_id=book.id,
-                summary=char_data.get('summary', None),
-                profile=char_data.get('profile', None),
-                dialogue_voice=char_data.get('dialogue_voice', None),
-                relationships=char_data.get('relationships', None),
-                role_potential=char_data.get('role_potential', None),
-                story_arc=char_data.get('story_arc', None)
-            )
-            self.session.add(character)
-        
+        rows = [
+            {
+                "name": char_data['name'],
+                "description": char_data['description'],
+                "is_protagonist": char_data.get('is_protagonist', False),
+                "book_id": book_id,
+                "summary": char_data.get('summary', None),
+                "profile": char_data.get('profile', None),
+                "dialogue_voice": char_data.get('dialogue_voice', None),
+                "relationships": char_data.get('relationships', None),
+                "role_potential": char_data.get('role_potential', None),
+                "story_arc": char_data.get('story_arc', None),
+            }
+            for char_data in characters_data
+        ]
+
+        # Deleted characters already in the session are removed from it as well
+        await self.session.execute(delete(Character).where(Character.book_id == book_id))
+        characters = await self._bulk_insert(Character, rows)
+        result = await self.session.execute(
+            update(Book).where(Book.id == book_id).values(version=Book.version + 1).returning(Book.version)
+        )
+        version = result.scalar_one_or_none()
         await self.session.commit()
 
-    async def finalize_and_generate_book(self, book_id: int) -> Book:
+        book = await self.session.get(Book, book_id)
+        if book is not None:
+            set_committed_value(book, "characters", characters)
+            set_committed_value(book, "version", version)
+        logging.info(f"Saved {len(characters)} characters for book {book_id}")
+        return characters
+
+    async def _generate_character_sheet_with_retry(self, book: Book, character: Character) -> dict:
+        """
+        Generates one character sheet, retrying on failure. If every attempt fails
+        the character's user-provided data is kept so the other sheets still count.
+        """
+        attempts = config.CHARACTER_SHEET_RETRIES + 1
+        for attempt in range(1, attempts + 1):
+            try:
+                logging.info(f"Generating character sheet for {character.name} (attempt {attempt}/{attempts})")
+                character_sheet = await self.book_generator.generate_character_sheet(
+                    character, book.world_description, book.user_prompt
+                )
+                return character_sheet.dict()
+            except Exception as e:
+                logging.warning(f"Character sheet for {character.name} failed (attempt {attempt}/{attempts}): {e}")
+                if attempt < attempts:
+                    await asyncio.sleep(config.CHARACTER_SHEET_RETRY_DELAY * attempt)
+
+        logging.error(f"Giving up on character sheet for {character.name}; keeping the user's description")
+        return {
+            "name": character.name,
+            "description": character.description,
+            "is_protagonist": character.is_protagonist,
+        }
+
+    async def _generate_character_sheets(
+        self,
+        book: Book,
+        on_progress: Optional[ProgressCallback] = None,
+        completed_sheets: Optional[dict] = None,
+    ) -> list[dict]:
+        """
+        Generates all character sheets concurrently, preserving character order.
+        Sheets found in `completed_sheets` (keyed by character id) are reused.
+        """
+        completed_sheets = dict(completed_sheets or {})
+        semaphore = asyncio.Semaphore(max(1, config.CHARACTER_SHEET_CONCURRENCY))
+        total = len(book.characters)
+
+        async def generate(character: Character) -> dict:
+            sheet = completed_sheets.get(str(character.id))
+            if sheet is not None:
+                return sheet
+            async with semaphore:
+                sheet = await self._generate_character_sheet_with_retry(book, character)
+            completed_sheets[str(character.id)] = sheet
+            if on_progress:
+                await on_progress(
+                    "character_sheet",
+                    character_id=character.id,
+                    name=character.name,
+                    sheet=sheet,
+                    done=len(completed_sheets),
+                    total=total,
+                )
+            return sheet
+
+        return list(await asyncio.gather(*(generate(character) for character in book.characters)))
+
+    async def finalize_and_generate_book(
+        self,
+        book_id: int,
+        on_progress: Optional[ProgressCallback] = None,
+        resume_state: Optional[dict] = None,
+    ) -> Book:
         """
         Marks the book as 'active' and triggers the generation process.
+
+        `on_progress` is awaited after each step with the step name and its data.
+        `resume_state` holds the results of steps that already finished in an
+        earlier, interrupted run (see JobManager) so they are not repeated.
         """
-        book = await self.get_book(book_id)
+        resume_state = resume_state or {}
+
+        async def report(step: str, **data) -> None:
+            if on_progress:
+                await on_progress(step, **data)
 
-        characters_data = []
-        characters = book.characters
-        for character in characters:
-            print(f"Generating character sheet for {character.name}")
-            character_sheet = await self.book_generator.generate_character_sheet(character, book.world_description, book.user_prompt)
-            llm_character_sheet = character_sheet.dict()
-            print(f"Character sheet for {character.name}: {llm_character_sheet}")
-            characters_data.append(llm_character_sheet)
-        
-        await self.save_characters_for_book(book_id=book_id, characters_data=characters_data)
-        
-        # After saving the characters, the book object in memory is stale.
-        # We re-fetch it from the database to get the updated characters
-        # before passing it to the next function.
         book = await self.get_book(book_id)
+        if book.status == "active" and book.chapters:
+            logging.info(f"Book {book_id} is already finalized")
+            return book
 
+        if not resume_state.get("characters_saved"):
+            characters_data = await self._generate_character_sheets(
+                book, on_progress, resume_state.get("character_sheets")
+            )
+            
+            # Also updates book.characters, so the book need not be fetched again
+            await self.replace_characters(book_id, characters_data)
+            await report("characters_saved", count=len(characters_data))
+
+        await report("concept_started")
         llm_concept = await self.book_generator.generate_initial_concept_for_book(book)
         
         # Convert the Pydantic BookConcept model to a dictionary for database storage
@@ -212,22 +409,25 @@ class BookService:
         # structured LLM output. We convert it to a dict to store in the Book SQLModel's
         # llm_concept JSON field for database persistence.
         book.llm_concept = llm_concept.dict()
+        book.version += 1
 
-        # Create Chapter objects from the LLM concept and persist them to the database
-        for chapter_data in llm_concept.chapters:
-            chapter = Chapter(
-                chapter_number=chapter_data.chapter_number,
-                title=chapter_data.chapter_title,
-                synopsis=chapter_data.chapter_synopsis,
-                book_id=book.id
-            )
-            self.session.add(chapter)
+        # Create the chapters from the LLM concept; chapters left by an
+        # interrupted earlier run are kept
+        await self._insert_chapters(book.id, [
+            {
+                "chapter_number": chapter_data.chapter_number,
+                "title": chapter_data.chapter_title,
+                "synopsis": chapter_data.chapter_synopsis,
+            }
+            for chapter_data in llm_concept.chapters
+        ])
 
         book.status = "active"
         
         self.session.add(book)
         await self.session.commit()
         await self.session.refresh(book)
+        await report("chapters_materialized", count=len(llm_concept.chapters))
 
         return book
 
@@ -254,71 +454,182 @@ class BookService:
         
         return chapter
 
-    async def build_chapter_prompt(self, chapter: Chapter, part: int, user_directives: str) -> str:
-        """Builds the prompt for chapter generation."""
+    async def get_chapter_by_number(self, book_id: int, chapter_number: int) -> Optional[Chapter]:
+        """Retrieves a single chapter of a book by its number."""
+        query = select(Chapter).where(Chapter.book_id == book_id, Chapter.chapter_number == chapter_number)
+        result = await self.session.execute(query)
+        return result.scalars().first()
+
+    async def get_book_prompt_context(self, book_id: int) -> BookPromptContext:
+        """
+        Returns the assembled character sheets, world and story fields and
+        chapter events of a book, building them only when the book's version
+        is not cached.
+        """
+        result = await self.session.execute(select(Book.version).where(Book.id == book_id))
+        version = result.scalar_one_or_none()
+        if version is None:
+            raise ValueError(f"Book with ID {book_id} not found.")
+        cached = book_context_cache.get(book_id, version)
+        if cached is not None:
+            return cached
+
+        result = await self.session.execute(
+            select(Book.world_description, Book.user_prompt, Book.llm_concept).where(Book.id == book_id)
+        )
+        book_row = result.one()
+        result = await self.session.execute(select(Character).where(Character.book_id == book_id))
+        book_context = BookPromptContext.build(
+            book_id,
+            version,
+            world_description=book_row.world_description,
+            user_prompt=book_row.user_prompt,
+            llm_concept=book_row.llm_concept,
+            characters=result.scalars().all(),
+        )
+        book_context_cache.put(book_context)
+        logging.info(f"Assembled prompt context of book {book_id}, version {version}")
+        return book_context
+
+    async def get_chapter_context(self, chapter: Chapter) -> ChapterPromptContext:
+        """
+        Loads what the prompt of a chapter needs: the book's prompt context
+        (from book_context_cache while the book's version is unchanged), the
+        chapter count and the previous chapter's summary and ending. Other
+        chapters' contents are not loaded.
+        """
+        book_context = await self.get_book_prompt_context(chapter.book_id)
+
+        result = await self.session.execute(
+            select(func.count(Chapter.id)).where(Chapter.book_id == chapter.book_id)
+        )
+        total_chapters = result.scalar_one()
+
+        context = ChapterPromptContext(
+            world_description=book_context.world_description,
+            user_prompt=book_context.user_prompt,
+            total_chapters=total_chapters,
+            chapter_events=book_context.events_by_chapter.get(chapter.chapter_number, ""),
+            characters=book_context.characters,
+            character_tokens=book_context.character_tokens,
+        )
+
+        if chapter.chapter_number > 1:
+            result = await self.session.execute(
+                select(Chapter.previous_storyline, Chapter.content).where(
+                    Chapter.book_id == chapter.book_id,
+                    Chapter.chapter_number == chapter.chapter_number - 1,
+                )
+            )
+            previous = result.first()
+            if previous is not None:
+                context.previous_storyline = previous.previous_storyline
+                if previous.content and "-----" in previous.content:
+                    context.previous_chapter_ending = previous.content.split("-----")[1].strip()
+
+        return context
+
+    async def retrieve_chapter_passages(self, chapter: Chapter, chapter_events: str = "") -> str:
+        """
+        Retrieves the passages of the book's earlier chapters most relevant to
+        the synopsis and events of `chapter`: the best RAG_TOP_K matches are
+        taken in order of relevance while they fit in RAG_CONTEXT_TOKEN_BUDGET,
+        then put back in story order.
+        """
+        vector_store = get_vector_store()
+        if vector_store is None or chapter.chapter_number <= 1:
+            return ""
+        query = "\n".join(part for part in (chapter.title, chapter.synopsis, chapter_events) if part)
+        if not query:
+            return ""
+        try:
+            results = await asyncio.to_thread(
+                vector_store.search_chapters, chapter.book_id, query, chapter.chapter_number, config.RAG_TOP_K
+            )
+        except Exception as e:
+            logging.warning(f"Retrieving passages for chapter {chapter.id} failed: {e}")
+            return ""
+
+        selected = []
+        budget = config.RAG_CONTEXT_TOKEN_BUDGET
+        for document, _score in results:
+            tokens = estimate_tokens(document.page_content)
+            if tokens > budget:
+                continue
+            selected.append(document)
+            budget -= tokens
+        selected.sort(key=lambda d: (d.metadata.get("chapter_number", 0), d.metadata.get("chunk", 0)))
+        logging.info(
+            f"Retrieved {len(selected)} of {len(results)} passages for chapter {chapter.id} "
+            f"({config.RAG_CONTEXT_TOKEN_BUDGET - budget} tokens)"
+        )
+        return "\n\n".join(
+            f"[Chapter {d.metadata.get('chapter_number')}]\n{d.page_content}" for d in selected
+        )
+
+    async def select_character_context(self, chapter: Chapter, context: ChapterPromptContext) -> str:
+        """
+        Renders the characters for a chapter prompt: full sheets for the ones
+        relevant to the synopsis and events of `chapter`, stubs for the rest.
+        """
+        characters = context.characters
+        if not characters:
+            return ""
+        query = "\n".join(part for part in (chapter.title, chapter.synopsis, context.chapter_events) if part)
+        query_vector = character_vectors = None
+        vector_store = get_vector_store() if config.CHARACTER_CONTEXT_USE_EMBEDDINGS else None
+        if vector_store is not None and query and len(characters) > config.CHARACTER_CONTEXT_MIN_CAST:
+            try:
+                # Character sheets come from the embedding cache after the first chapter
+                vectors = await asyncio.to_thread(
+                    vector_store.embeddings.embed_documents,
+                    [query] + [char.embedding_text for char in characters],
+                )
+                query_vector, character_vectors = vectors[0], vectors[1:]
+            except Exception as e:
+                logging.warning(f"Embedding characters for chapter {chapter.id} failed, using names and words only: {e}")
+
+        scores = score_characters(characters, query, query_vector, character_vectors)
+        selection = select_characters(characters, scores)
+        rendered, tokens_saved = render_character_context(selection, context.character_tokens)
+        logging.info(
+            f"Chapter {chapter.id}: {len(selection.full)} full character sheets, {len(selection.stubs)} stubs, "
+            f"~{tokens_saved} prompt tokens saved"
+        )
+        return rendered
+
+    async def build_chapter_prompt(
+        self, chapter: Chapter, part: int, user_directives: str, with_footer: bool = True
+    ) -> str:
+        """
+        Builds the prompt for chapter generation. Without `with_footer` the
+        language footer is left out, for prompts that wrap this one.
+        """
         logging.info(f"Building chapter prompt for chapter {chapter.id}, part {part}")
         
         try:
-            book = await self.get_book(chapter.book_id)
-            logging.info(f"Retrieved book {book.id} for chapter {chapter.id}")
-
-            # Get character context
-            characters_to_use = ""
-            if book.characters:
-                character_descriptions = [
-                    f"<name>{char.name}</name>"
-                    + f"<role>{'protagonist' if char.is_protagonist else 'supporting'}</role>"
-                    + f"<summary>{char.description}</summary>"
-                    + f"<dialogue_voice>{char.dialogue_voice}</dialogue_voice>"
-                    + f"<relationships>{char.relationships}</relationships>"
-                    + f"<role_potential>{char.role_potential}</role_potential>"
-                    + f"<story_arc>{char.story_arc}</story_arc>"
-                    for char in book.characters
-                ]
-                characters_to_use = "\n".join(character_descriptions)
-                logging.info(f"Found {len(book.characters)} characters for chapter {chapter.id}")
-
-            # Get chapter events from the stored concept
-            chapter_events = ""
-            if book.llm_concept:
-                try:
-                    concept_data = book.llm_concept
-                    if isinstance(book.llm_concept, str):
-                        concept_data = json.loads(book.llm_concept)
-                    
-                    if "chapters" in concept_data:
-                        for chapter_data in concept_data["chapters"]:
-                            if chapter_data.get("chapter_number") == chapter.chapter_number:
-                                events = chapter_data.get("chapter_events", [])
-                                if events:
-                                    event_descriptions = [f"• {event.get('event_title', '')}: {event.get('event_description', '')}" for event in events]
-                                    chapter_events = "\n".join(event_descriptions)
-                                    logging.info(f"Found {len(events)} events for chapter {chapter.id}")
-                                break
-                except (json.JSONDecodeError, KeyError, TypeError) as e:
-                    logging.warning(f"Error parsing chapter events for chapter {chapter.id}: {e}")
-                    chapter_events = ""
-
-            rag_retrieved_context = ""
-            previous_chapter_ending = ""
-
-            if chapter.chapter_number > 1:
-                previous_chapter_number = chapter.chapter_number - 1
-                for ch in book.chapters:
-                    if ch.chapter_number == previous_chapter_number:
-                        rag_retrieved_context = ch.previous_storyline
-                        previous_chapter_content = ch.content
-                        previous_chapter_ending = previous_chapter_content.split("-----")[1].strip()
-                        break
+            context = await self.get_chapter_context(chapter)
+            logging.info(f"Retrieved prompt context of book {chapter.book_id} for chapter {chapter.id}")
+
+            chapter_events = context.chapter_events
+
+            # Full sheets only for the characters this chapter is about
+            characters_to_use = await self.select_character_context(chapter, context)
+
+            rag_retrieved_context = context.previous_storyline or ""
+            passages = await self.retrieve_chapter_passages(chapter, chapter_events)
+            if passages:
+                rag_retrieved_context += "\n\nRelevant passages from earlier chapters:\n" + passages
+            previous_chapter_ending = context.previous_chapter_ending
 
             template_name = f"create_chapter_part{part}"
             prompt_params = {
                 "chapter": str(chapter.chapter_number),
                 "title": chapter.title,
-                "total_chapters": str(len(book.chapters)),
+                "total_chapters": str(context.total_chapters),
                 
-                "world_params": book.world_description,
-                "story_bits": book.user_prompt,
+                "world_params": context.world_description,
+                "story_bits": context.user_prompt,
                 "chapter_desc": chapter.synopsis,
                 "characters_to_use": characters_to_use,
                 "chapter_events": chapter_events,
@@ -332,7 +643,7 @@ class BookService:
             else:
                 prompt_params["previous_chapter_ending"] = previous_chapter_ending
 
-            prompt = get_template(template_name, **prompt_params)
+            prompt = get_template(template_name, with_footer=with_footer, **prompt_params)
             
             logging.info(f"Successfully built prompt for chapter {chapter.id}, part {part}")
             logging.info(f"Prompt: {prompt}")
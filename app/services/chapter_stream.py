@@ -0,0 +1,187 @@
+"""Shared, replayable chapter generation streams."""
+
+import asyncio
+import logging
+import secrets
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from app import config
+from app.services.background import task_tracker
+from app.services.single_flight import BroadcastStream
+
+
+class ChapterGeneration:
+    """
+    One upstream LLM generation of a chapter part. The generated chunks are
+    buffered with their sequence numbers so that any number of SSE clients can
+    follow it, and a reconnecting client can continue after the last chunk it saw.
+    """
+
+    def __init__(self, chapter_id: int, part: int, book_id: Optional[int] = None):
+        self.chapter_id = chapter_id
+        self.part = part
+        self.book_id = book_id
+        # Distinguishes the event ids of this generation from those of earlier
+        # ones (e.g. before a restart), whose sequence numbers mean other text
+        self.epoch = secrets.token_hex(4)
+        self.stream = BroadcastStream()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.stream.done
+
+    @property
+    def content(self) -> str:
+        """Everything generated so far."""
+        return "".join(self.stream.items)
+
+    def event_id(self, seq: int) -> str:
+        """SSE event id of the chunk with sequence number `seq`."""
+        return f"{self.epoch}:{seq}"
+
+    def resume_position(self, last_event_id: Optional[str]) -> Optional[int]:
+        """
+        Sequence number to continue from after the event `last_event_id`, or
+        None if that id belongs to another generation and the client must
+        discard what it has and replay from the start.
+        """
+        if last_event_id is None:
+            return 0
+        epoch, _, seq = last_event_id.partition(":")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq) + 1
+
+    def subscribe(self, start: int = 0) -> AsyncIterator[Tuple[int, str]]:
+        """Yields (sequence, chunk) pairs from `start` on, then follows live."""
+        return self.stream.subscribe(start)
+
+
+class ChapterGenerationHub:
+    """
+    Keeps at most one running generation per chapter part, decoupled from the
+    SSE connections that watch it. Finished generations are kept for a short
+    while so clients that reconnect right at the end can still catch up.
+    """
+
+    def __init__(self):
+        self._generations: Dict[Tuple[int, int], ChapterGeneration] = {}
+
+    def get(self, chapter_id: int, part: int) -> Optional[ChapterGeneration]:
+        """Returns the running or recently finished generation of a chapter part."""
+        return self._generations.get((chapter_id, part))
+
+    def get_active(self, chapter_id: int) -> Optional[ChapterGeneration]:
+        """Returns the generation currently running for any part of a chapter."""
+        for (generation_chapter_id, _), generation in self._generations.items():
+            if generation_chapter_id == chapter_id and not generation.done:
+                return generation
+        return None
+
+    def start(
+        self,
+        chapter_id: int,
+        part: int,
+        source: AsyncIterator[dict],
+        on_complete: Callable[[str], Awaitable[None]],
+        book_id: Optional[int] = None,
+        on_checkpoint: Optional[Callable[[str], Awaitable[None]]] = None,
+        on_error: Optional[Callable[[Exception], Awaitable[None]]] = None,
+        prefix: str = "",
+    ) -> ChapterGeneration:
+        """
+        Starts generating a chapter part from `source` (chunks as produced by
+        AIService.generate_response_stream). `on_complete` is awaited with the full
+        text before subscribers are told that the stream is finished.
+        `on_checkpoint` is awaited with the text so far every
+        CHAPTER_CHECKPOINT_CHUNKS chunks or CHAPTER_CHECKPOINT_SECONDS seconds,
+        and once more if the generation is interrupted. `on_error` is awaited
+        with the exception if the generation fails. A non-empty `prefix`
+        (previously generated text that `source` continues) is published as the
+        first chunk, so replays and the final content include it.
+        If the part is already being generated, the running generation is returned.
+        """
+        existing = self._generations.get((chapter_id, part))
+        if existing is not None and not existing.done:
+            logging.info(f"Chapter {chapter_id} part {part} is already being generated; attaching")
+            return existing
+
+        generation = ChapterGeneration(chapter_id, part, book_id)
+        if prefix:
+            generation.stream.publish(prefix)
+        self._generations[(chapter_id, part)] = generation
+        generation.task = asyncio.create_task(self._produce(generation, source, on_complete, on_checkpoint, on_error))
+        return generation
+
+    async def _produce(
+        self,
+        generation: ChapterGeneration,
+        source: AsyncIterator[dict],
+        on_complete: Callable[[str], Awaitable[None]],
+        on_checkpoint: Optional[Callable[[str], Awaitable[None]]] = None,
+        on_error: Optional[Callable[[Exception], Awaitable[None]]] = None,
+    ) -> None:
+        key = (generation.chapter_id, generation.part)
+        label = f"chapter {generation.chapter_id}, part {generation.part}"
+        checkpointed_chunks = len(generation.stream.items)
+        last_checkpoint = time.monotonic()
+        streaming = True
+        try:
+            logging.info(f"Starting generation of {label}")
+            async for chunk in source:
+                content = chunk.get("data", "")
+                if not content:
+                    continue
+                generation.stream.publish(content)
+                if on_checkpoint is not None:
+                    produced = len(generation.stream.items)
+                    if (
+                        produced - checkpointed_chunks >= config.CHAPTER_CHECKPOINT_CHUNKS
+                        or time.monotonic() - last_checkpoint >= config.CHAPTER_CHECKPOINT_SECONDS
+                    ):
+                        try:
+                            await on_checkpoint(generation.content)
+                        except Exception as e:
+                            logging.warning(f"Checkpoint of {label} failed: {e}")
+                        checkpointed_chunks = produced
+                        last_checkpoint = time.monotonic()
+            streaming = False
+            logging.info(f"Generation of {label} finished, content length: {len(generation.content)}")
+            # The final write must survive a shutdown that cancels this task
+            final_write = task_tracker.spawn(on_complete(generation.content), name=f"finalize {label}")
+            await asyncio.shield(final_write)
+            generation.stream.close()
+        except asyncio.CancelledError:
+            if streaming and on_checkpoint is not None and generation.stream.items:
+                task_tracker.spawn(on_checkpoint(generation.content), name=f"checkpoint {label}")
+            generation.stream.close(RuntimeError("Chapter generation was interrupted."))
+            raise
+        except Exception as e:
+            logging.error(f"Generation of {label} failed: {e}", exc_info=True)
+            if streaming and on_checkpoint is not None and generation.stream.items:
+                task_tracker.spawn(on_checkpoint(generation.content), name=f"checkpoint {label}")
+            if on_error is not None:
+                task_tracker.spawn(on_error(e), name=f"fail {label}")
+            generation.stream.close(e)
+        finally:
+            asyncio.get_running_loop().call_later(
+                config.CHAPTER_STREAM_LINGER_SECONDS, self._forget, key, generation
+            )
+
+    def _forget(self, key: Tuple[int, int], generation: ChapterGeneration) -> None:
+        if self._generations.get(key) is generation:
+            del self._generations[key]
+
+    async def shutdown(self) -> None:
+        """Stops all running generations."""
+        tasks = [g.task for g in self._generations.values() if g.task and not g.task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Global instance
+chapter_generations = ChapterGenerationHub()
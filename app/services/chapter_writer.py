@@ -0,0 +1,307 @@
+"""Chapter writing: generation, checkpoints, finalization and recovery."""
+
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import select
+
+from app.database import async_read_session_maker, async_session_maker
+from app.models.models import Chapter
+from app.prompts.templates import get_template
+from app.services.background import task_tracker
+from app.services.book_service import BookService
+from app.services.chapter_stream import ChapterGeneration, chapter_generations
+from app.services.llm_scheduler import PRIORITY_BACKGROUND
+from app.services.vector_store import get_vector_store
+from app.services.write_queue import write_queue
+from app.utils.text_parser import RENDERER_VERSION, parse_markdown
+
+INTERRUPTED_CHAPTER_STATUSES = ("writing_part1", "writing_part2")
+
+
+def chapter_html_values(content: Optional[str]) -> dict:
+    """
+    The stored HTML rendering of chapter content. Every write of `content`
+    writes these columns with it, so readers can use the stored HTML as is.
+    """
+    return {
+        "content_html": parse_markdown(content) if content else None,
+        "content_html_version": RENDERER_VERSION,
+    }
+
+
+async def load_chapter_html(session, chapter: Chapter) -> str:
+    """
+    Returns the HTML of a chapter's content. The stored rendering is used
+    when it was made by the current renderer; otherwise the content is
+    rendered in memory, without writing anything.
+    """
+    await session.refresh(chapter, attribute_names=["content_html", "content_html_version"])
+    if chapter.content_html_version == RENDERER_VERSION:
+        return chapter.content_html or ""
+    await session.refresh(chapter, attribute_names=["content"])
+    return parse_markdown(chapter.content) if chapter.content else ""
+
+
+async def mark_chapter_writing(chapter: Chapter, part: int, user_directives: str) -> None:
+    """
+    Marks a chapter part as being written, through the write queue. The
+    change is mirrored on `chapter` without making its session write it again.
+    """
+    values = {"status": f"writing_part{part}", "user_directives": user_directives, "partial_content": None}
+    await write_queue.execute(update(Chapter).where(Chapter.id == chapter.id).values(**values))
+    for key, value in values.items():
+        set_committed_value(chapter, key, value)
+
+
+async def checkpoint_chapter_writing(chapter_id: int, partial_content: str):
+    """Persists the text generated so far for the part currently being written."""
+    await write_queue.execute(
+        update(Chapter).where(Chapter.id == chapter_id).values(partial_content=partial_content)
+    )
+    logging.info(f"Checkpointed chapter id {chapter_id} ({len(partial_content)} characters)")
+
+
+async def fail_chapter_writing(chapter_id: int, error: Exception):
+    """Marks a chapter as failed so the part is not resumed automatically."""
+    await write_queue.execute(update(Chapter).where(Chapter.id == chapter_id).values(status="failed"))
+    logging.info(f"Marked chapter id {chapter_id} as failed: {error}")
+
+
+def has_checkpoint(chapter: Chapter) -> bool:
+    """Whether an interrupted chapter part has generated text to continue from."""
+    return bool((chapter.partial_content or "").strip())
+
+
+async def finalize_chapter_writing(chapter_id: int, full_content: str, part: int):
+    """Saves the final chapter content and updates the status."""
+    # Part 2 is appended to part 1, so only then is the current content needed
+    async with async_read_session_maker() as session:
+        result = await session.execute(select(Chapter.id, Chapter.content).where(Chapter.id == chapter_id))
+        row = result.one_or_none()
+    if row is None:
+        logging.error(f"Cannot finalize chapter id {chapter_id}: not found")
+        return
+
+    if part == 1:
+        content = full_content + "\n-----\n"
+        status = "part1_completed"
+    else: # part == 2
+        part1_content = row.content or ""
+        if "-----" in part1_content:
+            # Keep only part 1 so rewriting part 2 replaces the old part 2
+            part1_content = part1_content.split("-----")[0] + "-----\n"
+        content = part1_content + "\n\n" + full_content
+        status = "completed"
+    values = {
+        "content": content,
+        "status": status,
+        "partial_content": None,
+        **chapter_html_values(content),
+    }
+
+    await write_queue.execute(update(Chapter).where(Chapter.id == chapter_id).values(**values))
+    logging.info(f"Successfully finalized chapter id {chapter_id}, part {part}.")
+
+    # generate a summary of the storyline so far
+    if part == 2:
+        task_tracker.spawn(generate_storyline_summary(chapter_id), name=f"summary chapter {chapter_id}")
+        if get_vector_store() is not None:
+            task_tracker.spawn(
+                index_completed_chapter(chapter_id, values["content"]), name=f"index chapter {chapter_id}"
+            )
+
+
+async def index_completed_chapter(chapter_id: int, content: str):
+    """Indexes a completed chapter in its book's vector collection for retrieval."""
+    vector_store = get_vector_store()
+    if vector_store is None:
+        return
+    try:
+        async with async_session_maker() as session:
+            chapter = await session.get(Chapter, chapter_id, options=[load_only(Chapter.book_id, Chapter.chapter_number)])
+            if not chapter:
+                return
+            book_id, chapter_number = chapter.book_id, chapter.chapter_number
+        chunks = await asyncio.to_thread(vector_store.index_chapter, book_id, chapter_id, chapter_number, content)
+        logging.info(f"Indexed chapter {chapter_number} of book {book_id} in {chunks} chunks")
+    except Exception as e:
+        logging.error(f"Indexing chapter id {chapter_id} failed: {e}", exc_info=True)
+
+
+async def index_unindexed_chapters():
+    """
+    Indexes the completed chapters that are missing from their book's vector
+    collection, such as chapters completed before chapters were indexed.
+    """
+    vector_store = get_vector_store()
+    if vector_store is None:
+        return
+    async with async_read_session_maker() as session:
+        result = await session.execute(
+            select(Chapter.id, Chapter.book_id, Chapter.chapter_number).where(Chapter.status == "completed")
+        )
+        chapters = result.all()
+
+    indexed = 0
+    for chapter_id, book_id, chapter_number in chapters:
+        try:
+            if await asyncio.to_thread(vector_store.is_chapter_indexed, book_id, chapter_id):
+                continue
+            async with async_read_session_maker() as session:
+                result = await session.execute(select(Chapter.content).where(Chapter.id == chapter_id))
+                content = result.scalar_one_or_none()
+            if not content:
+                continue
+            await asyncio.to_thread(vector_store.index_chapter, book_id, chapter_id, chapter_number, content)
+            indexed += 1
+        except Exception as e:
+            logging.error(f"Indexing chapter id {chapter_id} failed: {e}", exc_info=True)
+    if indexed:
+        logging.info(f"Indexed {indexed} completed chapter(s) missing from the vector store")
+
+
+async def generate_storyline_summary(chapter_id: int):
+    """Generates the storyline summary of a completed chapter in the background."""
+    session = None
+    try:
+        session = async_session_maker()
+        chapter = await session.get(Chapter, chapter_id)
+        if chapter:
+            current_chapter_number = chapter.chapter_number
+            book_service = BookService(session)
+            # Only the previous, current and next chapter are needed
+            result = await session.execute(
+                select(Chapter)
+                .where(
+                    Chapter.book_id == chapter.book_id,
+                    Chapter.chapter_number.between(current_chapter_number - 1, current_chapter_number + 1),
+                )
+                .order_by(Chapter.chapter_number)
+            )
+            previous_storyline = ""
+            next_chapter_synopsis = ""
+            for ch in result.scalars().all():
+                # get previous summary for consistency
+                if ch.chapter_number == current_chapter_number - 1 and ch.previous_storyline:
+                    previous_storyline += ch.previous_storyline
+                elif ch.chapter_number == current_chapter_number - 1 and not ch.previous_storyline:
+                    previous_storyline += ch.content
+                # for the current chapter, use the actual full content
+                elif ch.chapter_number == current_chapter_number:
+                    previous_storyline += ch.content
+                # the next chapter, if it exists, for context
+                elif ch.chapter_number == current_chapter_number + 1:
+                    next_chapter_synopsis = ch.synopsis
+            
+            # call the LLM to create a summary of the storyline so far
+            if previous_storyline and next_chapter_synopsis:
+                storyline_synopsis = await book_service.ai_service.generate_response(
+                    get_template("create_summary",
+                                previous_storyline=previous_storyline,
+                                next_chapter_synopsis=next_chapter_synopsis),
+                    template_name="create_summary",
+                    priority=PRIORITY_BACKGROUND,
+                    book_id=chapter.book_id,
+                )
+                if storyline_synopsis:
+                    await write_queue.execute(
+                        update(Chapter).where(Chapter.id == chapter_id).values(previous_storyline=storyline_synopsis)
+                    )
+                    logging.info(f"Successfully generated storyline synopsis for chapter id {chapter_id}.")
+                else:
+                    logging.error(f"Failed to generate storyline synopsis for chapter id {chapter_id}.")
+
+    except Exception as e:
+        logging.error(f"Background finalization failed for chapter id {chapter_id}: {e}", exc_info=True)
+    finally:
+        if session:
+            await session.close()
+
+
+def start_chapter_generation(
+    book_service: BookService,
+    chapter: Chapter,
+    part: int,
+    prompt: str,
+    prefix: str = "",
+) -> ChapterGeneration:
+    """
+    Starts (or attaches to) the generation of a chapter part. `prefix` is text
+    that was already written before and which the generation continues.
+    """
+    chapter_id = chapter.id
+
+    async def on_complete(full_content: str):
+        await finalize_chapter_writing(chapter_id, full_content, part)
+
+    async def on_checkpoint(partial_content: str):
+        await checkpoint_chapter_writing(chapter_id, partial_content)
+
+    async def on_error(error: Exception):
+        await fail_chapter_writing(chapter_id, error)
+
+    return chapter_generations.start(
+        chapter_id,
+        part,
+        book_service.ai_service.generate_response_stream(prompt, book_id=chapter.book_id),
+        on_complete,
+        book_id=chapter.book_id,
+        on_checkpoint=on_checkpoint,
+        on_error=on_error,
+        prefix=prefix,
+    )
+
+
+async def resume_chapter_generation(book_service: BookService, chapter: Chapter) -> Optional[ChapterGeneration]:
+    """
+    Continues an interrupted chapter part from its last checkpoint instead of
+    starting over. Returns None if the chapter is not being written.
+    """
+    if chapter.status not in INTERRUPTED_CHAPTER_STATUSES:
+        return None
+    part = int(chapter.status[-1])
+
+    generation = chapter_generations.get(chapter.id, part)
+    if generation is not None and not generation.done:
+        return generation
+
+    user_directives = chapter.user_directives or ""
+    if has_checkpoint(chapter):
+        partial_content = chapter.partial_content
+        # The continuation prompt ends with the language footer itself
+        original_prompt = await book_service.build_chapter_prompt(chapter, part, user_directives, with_footer=False)
+        prompt = get_template("continue_chapter", original_prompt=original_prompt, partial_content=partial_content)
+        logging.info(f"Resuming chapter id {chapter.id}, part {part} after {len(partial_content)} characters")
+    else:
+        partial_content = ""
+        prompt = await book_service.build_chapter_prompt(chapter, part, user_directives)
+        logging.info(f"Restarting chapter id {chapter.id}, part {part} (no checkpoint)")
+
+    return start_chapter_generation(book_service, chapter, part, prompt, prefix=partial_content)
+
+
+async def recover_interrupted_chapters() -> None:
+    """
+    Resumes the chapters that a restart interrupted after their last
+    checkpoint. Chapters without a checkpoint are left for the user to resume.
+    """
+    async with async_session_maker() as session:
+        result = await session.execute(select(Chapter).where(Chapter.status.in_(INTERRUPTED_CHAPTER_STATUSES)))
+        interrupted = result.scalars().all()
+        chapters = [chapter for chapter in interrupted if has_checkpoint(chapter)]
+        if len(chapters) < len(interrupted):
+            logging.info(f"Leaving {len(interrupted) - len(chapters)} interrupted chapter(s) without a checkpoint")
+        if not chapters:
+            return
+        logging.info(f"Found {len(chapters)} interrupted chapter(s) to resume")
+        book_service = BookService(session)
+        for chapter in chapters:
+            try:
+                await resume_chapter_generation(book_service, chapter)
+            except Exception as e:
+                logging.error(f"Could not resume chapter id {chapter.id}: {e}", exc_info=True)
@@ -0,0 +1,158 @@
+"""Persistent cache and request batching for embeddings."""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+# Largest number of keys looked up per SELECT (SQLite's variable limit is 999 on old builds)
+_LOOKUP_CHUNK = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with a persistent cache keyed by (model, text
+    hash). Vectors are stored as float32 BLOBs in a SQLite file. Texts that
+    are not cached are deduplicated and sent to the model in batches of at
+    most `batch_size`; queries share the cache with documents.
+    """
+
+    def __init__(self, inner: Embeddings, model: str, sqlite_path: Optional[str], batch_size: int = 64):
+        self.inner = inner
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+        self.embedded_texts = 0
+        self.embedding_seconds = 0.0
+        self.max_request_seconds = 0.0
+
+        if sqlite_path:
+            self._open_db(sqlite_path)
+
+    def _open_db(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _db_get(self, hashes: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        if self._db is None or not hashes:
+            return found
+        try:
+            with self._db_lock:
+                for start in range(0, len(hashes), _LOOKUP_CHUNK):
+                    chunk = hashes[start:start + _LOOKUP_CHUNK]
+                    rows = self._db.execute(
+                        "SELECT text_hash, vector FROM embedding_cache"
+                        f" WHERE model = ? AND text_hash IN ({', '.join('?' * len(chunk))})",
+                        (self.model, *chunk),
+                    ).fetchall()
+                    for text_hash, blob in rows:
+                        vector = array("f")
+                        vector.frombytes(blob)
+                        found[text_hash] = vector.tolist()
+        except sqlite3.Error as e:
+            # Whatever was not found is embedded again
+            logging.warning(f"Could not read cached embeddings: {e}")
+        return found
+
+    def _db_set(self, vectors: Dict[str, List[float]]) -> None:
+        if self._db is None or not vectors:
+            return
+        try:
+            with self._db_lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (model, text_hash, vector) VALUES (?, ?, ?)",
+                    [(self.model, h, array("f", v).tobytes()) for h, v in vectors.items()],
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            logging.warning(f"Could not persist embeddings: {e}")
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        started = time.perf_counter()
+        vectors = self.inner.embed_documents(texts)
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self.requests += 1
+            self.embedded_texts += len(texts)
+            self.embedding_seconds += elapsed
+            self.max_request_seconds = max(self.max_request_seconds, elapsed)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [self.text_hash(text) for text in texts]
+        found = self._db_get(list(dict.fromkeys(hashes)))
+
+        # Each missing text is embedded once, however often it occurs
+        missing: Dict[str, str] = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in found and text_hash not in missing:
+                missing[text_hash] = text
+        miss_count = sum(1 for text_hash in hashes if text_hash in missing)
+        with self._stats_lock:
+            self.hits += len(texts) - miss_count
+            self.misses += miss_count
+
+        if missing:
+            missing_hashes = list(missing)
+            new_vectors: Dict[str, List[float]] = {}
+            for start in range(0, len(missing_hashes), self.batch_size):
+                batch = missing_hashes[start:start + self.batch_size]
+                vectors = self._embed_batch([missing[h] for h in batch])
+                new_vectors.update(zip(batch, vectors))
+            self._db_set(new_vectors)
+            found.update(new_vectors)
+
+        return [found[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> dict:
+        """Cache hit rate and latency of the requests sent to the embedding model."""
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "requests": self.requests,
+            "embedded_texts": self.embedded_texts,
+            "avg_batch_size": round(self.embedded_texts / self.requests, 2) if self.requests else 0.0,
+            "avg_request_ms": round(1000 * self.embedding_seconds / self.requests, 1) if self.requests else 0.0,
+            "max_request_ms": round(1000 * self.max_request_seconds, 1),
+        }
+
+    def close(self) -> None:
+        """Closes the SQLite file."""
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
@@ -0,0 +1,185 @@
+"""Background jobs for long-running book operations."""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Dict, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+
+from app.database import async_session_maker
+from app.models.models import Book, Job
+from app.services.book_service import BookService
+from app.services.single_flight import BroadcastStream
+
+JOB_FINALIZE_BOOK = "finalize_book"
+ACTIVE_JOB_STATUSES = ("pending", "running")
+
+
+class JobManager:
+    """
+    Runs book finalization as a background job. Each job is persisted in the
+    `job` table together with the results of the steps it has finished, so a
+    job interrupted by a restart is resumed from where it stopped. Progress
+    events are buffered per job and can be followed by any number of clients.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._streams: Dict[int, BroadcastStream] = {}
+        self._start_locks: Dict[int, asyncio.Lock] = {}
+
+    async def _find_active_job(self, session, book_id: int, kind: str) -> Optional[Job]:
+        result = await session.execute(
+            select(Job)
+            .where(Job.book_id == book_id, Job.kind == kind, Job.status.in_(ACTIVE_JOB_STATUSES))
+            .order_by(Job.created_at.desc())
+        )
+        return result.scalars().first()
+
+    async def start_finalize_book(self, book_id: int) -> Job:
+        """Starts finalizing a book, or returns the job that is already doing so."""
+        # Concurrent requests for the same book wait here; the unique index on
+        # active jobs covers requests handled by other processes
+        async with self._start_locks.setdefault(book_id, asyncio.Lock()):
+            async with async_session_maker() as session:
+                job = await self._find_active_job(session, book_id, JOB_FINALIZE_BOOK)
+                if job is None:
+                    job = Job(kind=JOB_FINALIZE_BOOK, book_id=book_id, state={"events": []})
+                    session.add(job)
+                    try:
+                        await session.commit()
+                        await session.refresh(job)
+                        logging.info(f"Created finalize job {job.id} for book {book_id}")
+                    except IntegrityError:
+                        await session.rollback()
+                        job = await self._find_active_job(session, book_id, JOB_FINALIZE_BOOK)
+                        if job is None:
+                            raise
+                        # Created by another process, which runs it
+                        logging.info(f"Book {book_id} is already being finalized by job {job.id}")
+                        return job
+
+            if job.id not in self._tasks:
+                self._spawn(job)
+        return job
+
+    async def get_latest_job(self, book_id: int, kind: str = JOB_FINALIZE_BOOK) -> Optional[Job]:
+        """Returns the most recent job of `kind` for a book."""
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(Job).where(Job.book_id == book_id, Job.kind == kind).order_by(Job.created_at.desc())
+            )
+            return result.scalars().first()
+
+    async def resume_pending(self) -> None:
+        """Restarts jobs that were pending or running when the process stopped."""
+        async with async_session_maker() as session:
+            result = await session.execute(select(Job).where(Job.status.in_(ACTIVE_JOB_STATUSES)))
+            jobs = result.scalars().all()
+        for job in jobs:
+            if job.id not in self._tasks:
+                logging.info(f"Resuming {job.kind} job {job.id} for book {job.book_id}")
+                self._spawn(job)
+
+    def _spawn(self, job: Job) -> None:
+        stream = BroadcastStream()
+        # Replay what was reported before an interruption to new subscribers
+        for event in (job.state or {}).get("events", []):
+            stream.publish(event)
+        self._streams[job.id] = stream
+        task = asyncio.create_task(self._run_finalize_book(job.id, job.book_id, dict(job.state or {})))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda t, job_id=job.id: self._tasks.pop(job_id, None))
+
+    async def _update_job(self, job_id: int, **fields) -> None:
+        async with async_session_maker() as session:
+            job = await session.get(Job, job_id)
+            if job is None:
+                return
+            for key, value in fields.items():
+                setattr(job, key, value)
+            job.updated_at = datetime.utcnow()
+            session.add(job)
+            await session.commit()
+
+    async def _run_finalize_book(self, job_id: int, book_id: int, state: dict) -> None:
+        stream = self._streams[job_id]
+        state.setdefault("events", [])
+        state.setdefault("character_sheets", {})
+
+        async def on_progress(step: str, **data) -> None:
+            if step == "character_sheet":
+                state["character_sheets"][str(data.pop("character_id"))] = data.pop("sheet")
+            elif step == "characters_saved":
+                state["characters_saved"] = True
+            event = {"step": step, **data}
+            state["events"].append(event)
+            stream.publish(event)
+            # Assign a copy so the JSON column is detected as changed
+            await self._update_job(job_id, state=dict(state))
+
+        try:
+            await self._update_job(job_id, status="running")
+            if not state["events"]:
+                await on_progress("started")
+            async with async_session_maker() as session:
+                book_service = BookService(session)
+                await book_service.finalize_and_generate_book(
+                    book_id, on_progress=on_progress, resume_state=state
+                )
+            event = {"step": "completed"}
+            state["events"].append(event)
+            await self._update_job(job_id, status="completed", state=dict(state))
+            stream.publish(event)
+            logging.info(f"Finalize job {job_id} for book {book_id} completed")
+        except asyncio.CancelledError:
+            # Left as 'running' in the database so it is resumed on the next start
+            logging.info(f"Finalize job {job_id} for book {book_id} interrupted")
+            raise
+        except Exception as e:
+            logging.error(f"Finalize job {job_id} for book {book_id} failed: {e}", exc_info=True)
+            event = {"step": "failed", "error": str(e)}
+            state["events"].append(event)
+            await self._update_job(job_id, status="failed", state=dict(state), error=str(e))
+            async with async_session_maker() as session:
+                book = await session.get(Book, book_id)
+                if book:
+                    book.status = "failed"
+                    session.add(book)
+                    await session.commit()
+            stream.publish(event)
+        finally:
+            stream.close()
+            if self._streams.get(job_id) is stream:
+                del self._streams[job_id]
+
+    async def subscribe(self, job: Job) -> AsyncIterator[dict]:
+        """
+        Yields the progress events of a job: everything reported so far, then
+        live events until the job finishes.
+        """
+        stream = self._streams.get(job.id)
+        if stream is not None:
+            async for _, event in stream.subscribe():
+                yield event
+            return
+
+        # Not running in this process: replay what was persisted
+        async with async_session_maker() as session:
+            stored = await session.get(Job, job.id)
+        for event in ((stored.state if stored else None) or {}).get("events", []):
+            yield event
+
+    async def shutdown(self) -> None:
+        """Cancels running jobs; they stay 'running' and are resumed on startup."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Global instance
+job_manager = JobManager()
@@ -0,0 +1,190 @@
+"""Content-addressed cache for LLM text responses."""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache for LLM responses: an in-memory LRU in front of an optional
+    SQLite file. Entries are keyed by a hash of everything that determines the
+    output (template, rendered prompt, model, temperature) and expire after a TTL.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: Optional[float] = 86400,
+        sqlite_path: Optional[str] = None,
+        sqlite_max_entries: int = 10000,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.sqlite_path = sqlite_path
+        self.sqlite_max_entries = sqlite_max_entries
+
+        # key -> (expires_at, value, generation_seconds)
+        self._memory: "OrderedDict[str, Tuple[Optional[float], str, float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.sqlite_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+        if sqlite_path:
+            self._open_db(sqlite_path)
+
+    @staticmethod
+    def make_key(template_name: Optional[str], prompt_text: str, model: str, temperature: float) -> str:
+        """Builds the cache key for a single LLM call."""
+        digest = hashlib.sha256()
+        for part in (template_name or "", model, repr(float(temperature)), prompt_text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def _open_db(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL,"
+            " generation_seconds REAL NOT NULL DEFAULT 0,"
+            " last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)")
+        self._db.commit()
+
+    def _is_expired(self, expires_at: Optional[float], now: float) -> bool:
+        return expires_at is not None and expires_at <= now
+
+    def _remember(self, key: str, expires_at: Optional[float], value: str, generation_seconds: float) -> None:
+        self._memory[key] = (expires_at, value, generation_seconds)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _db_get(self, key: str, now: float) -> Optional[Tuple[Optional[float], str, float]]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT expires_at, value, generation_seconds FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self._is_expired(row[0], now):
+                self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            return row
+
+    def _db_set(self, key: str, expires_at: Optional[float], value: str, generation_seconds: float, now: float) -> int:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, generation_seconds, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, value, expires_at, generation_seconds, now),
+            )
+            self._db.execute("DELETE FROM llm_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            (count,) = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            evicted = 0
+            if count > self.sqlite_max_entries:
+                evicted = count - self.sqlite_max_entries
+                self._db.execute(
+                    "DELETE FROM llm_cache WHERE key IN"
+                    " (SELECT key FROM llm_cache ORDER BY last_access LIMIT ?)",
+                    (evicted,),
+                )
+            self._db.commit()
+            return evicted
+
+    async def get(self, key: str) -> Optional[str]:
+        """Returns the cached response for `key`, or None on a miss."""
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if self._is_expired(entry[0], now):
+                del self._memory[key]
+            else:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self.saved_seconds += entry[2]
+                return entry[1]
+
+        if self._db is not None:
+            try:
+                row = await asyncio.to_thread(self._db_get, key, now)
+            except sqlite3.Error as e:
+                logging.warning(f"Could not read LLM cache entry: {e}")
+                row = None
+            if row is not None:
+                expires_at, value, generation_seconds = row
+                self._remember(key, expires_at, value, generation_seconds)
+                self.sqlite_hits += 1
+                self.saved_seconds += generation_seconds
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str, generation_seconds: float = 0.0, ttl_seconds: Optional[float] = None) -> None:
+        """Stores a response. `generation_seconds` is what a later hit saves."""
+        now = time.time()
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        expires_at = now + ttl if ttl else None
+        self._remember(key, expires_at, value, generation_seconds)
+        self.stores += 1
+        if self._db is not None:
+            try:
+                self.evictions += await asyncio.to_thread(
+                    self._db_set, key, expires_at, value, generation_seconds, now
+                )
+            except sqlite3.Error as e:
+                logging.warning(f"Could not persist LLM cache entry: {e}")
+
+    def clear(self) -> None:
+        """Drops all cached entries from both tiers."""
+        self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and the backend time saved by cache hits."""
+        lookups = self.memory_hits + self.sqlite_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "sqlite_hits": self.sqlite_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.sqlite_hits) / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+    def close(self) -> None:
+        """Closes the SQLite tier."""
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
@@ -0,0 +1,102 @@
+"""Process-wide registry of LLM clients and their HTTP connection pools."""
+
+import logging
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from app import config
+
+
+class LLMClientRegistry:
+    """
+    Holds one pooled HTTP client per backend host and one ChatOpenAI per
+    (model, temperature), so keep-alive connections survive across requests.
+    """
+
+    def __init__(self):
+        self._http_clients: Dict[str, httpx.AsyncClient] = {}
+        self._chat_models: Dict[Tuple[str, str, float], ChatOpenAI] = {}
+        self._closed = False
+
+    @staticmethod
+    def _host_key(base_url: str) -> str:
+        parts = urlsplit(base_url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=config.LLM_POOL_MAX_CONNECTIONS_PER_HOST,
+            max_keepalive_connections=config.LLM_POOL_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.LLM_POOL_KEEPALIVE_EXPIRY,
+        )
+
+    def get_http_client(self, base_url: str = None) -> httpx.AsyncClient:
+        """Returns the pooled async HTTP client for the host of `base_url`."""
+        base_url = base_url or config.OPENAI_API_BASE
+        host = self._host_key(base_url)
+        client = self._http_clients.get(host)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                limits=self._limits(),
+                timeout=httpx.Timeout(
+                    config.LLM_REQUEST_TIMEOUT,
+                    connect=config.LLM_CONNECT_TIMEOUT,
+                ),
+            )
+            self._http_clients[host] = client
+            logging.info(
+                f"Created LLM connection pool for {host} "
+                f"(max_connections={config.LLM_POOL_MAX_CONNECTIONS_PER_HOST}, "
+                f"keepalive={config.LLM_POOL_MAX_KEEPALIVE_CONNECTIONS})"
+            )
+        return client
+
+    def get_chat_model(
+        self,
+        model: Optional[str] = None,
+        temperature: float = 1,
+        base_url: Optional[str] = None,
+    ) -> ChatOpenAI:
+        """Returns a shared streaming ChatOpenAI bound to the pooled HTTP client."""
+        if self._closed:
+            raise RuntimeError("LLM client registry has been closed.")
+        model = model or config.LLM_MODEL
+        base_url = base_url or config.OPENAI_API_BASE
+        key = (model, base_url, temperature)
+        chat_model = self._chat_models.get(key)
+        if chat_model is None:
+            chat_model = ChatOpenAI(
+                model=model,
+                temperature=temperature,
+                api_key=config.OPENAI_API_KEY,
+                base_url=base_url,
+                streaming=True,
+                max_retries=config.LLM_MAX_RETRIES,
+                http_async_client=self.get_http_client(base_url),
+            )
+            self._chat_models[key] = chat_model
+        return chat_model
+
+    def open(self) -> None:
+        """Re-arms the registry (e.g. when the app is started again in tests)."""
+        self._closed = False
+
+    async def aclose(self) -> None:
+        """Closes all pooled connections. Called on application shutdown."""
+        self._closed = True
+        self._chat_models.clear()
+        clients = list(self._http_clients.values())
+        self._http_clients.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logging.warning(f"Error closing LLM HTTP client: {e}")
+        logging.info(f"Closed {len(clients)} LLM connection pool(s)")
+
+
+# Global instance
+llm_clients = LLMClientRegistry()
@@ -0,0 +1,154 @@
+"""Priority-aware admission control for calls to the LLM backend."""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+# Priority classes, highest first
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_STREAMING = "streaming"
+PRIORITY_BACKGROUND = "background"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_STREAMING, PRIORITY_BACKGROUND)
+
+
+class _Waiter:
+    __slots__ = ("future", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class _PriorityStats:
+    __slots__ = ("granted", "total_wait", "max_wait")
+
+    def __init__(self):
+        self.granted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class LLMScheduler:
+    """
+    Limits the number of concurrent LLM calls to the backend's slot count and
+    hands out free slots by priority class. Within a class, waiting calls are
+    served round-robin per book so one busy book cannot starve the others.
+    `reserved_interactive_slots` slots are only ever given to interactive calls,
+    so short wizard calls still get through while long streams occupy the rest.
+    """
+
+    def __init__(self, max_concurrency: int = 4, reserved_interactive_slots: int = 1):
+        self.max_concurrency = max(1, max_concurrency)
+        self.reserved_interactive_slots = min(max(0, reserved_interactive_slots), self.max_concurrency - 1)
+        self.active = 0
+        # priority -> fair key (book) -> waiters, in round-robin order
+        self._queues: Dict[str, "OrderedDict[object, Deque[_Waiter]]"] = {
+            priority: OrderedDict() for priority in PRIORITIES
+        }
+        self._stats: Dict[str, _PriorityStats] = {priority: _PriorityStats() for priority in PRIORITIES}
+
+    def _limit_for(self, priority: str) -> int:
+        if priority == PRIORITY_INTERACTIVE:
+            return self.max_concurrency
+        return self.max_concurrency - self.reserved_interactive_slots
+
+    def _queue_depth(self, priority: str) -> int:
+        return sum(len(waiters) for waiters in self._queues[priority].values())
+
+    def _has_waiters(self, priority: str) -> bool:
+        return bool(self._queues[priority])
+
+    def _grant(self, priority: str, waited: float) -> None:
+        self.active += 1
+        stats = self._stats[priority]
+        stats.granted += 1
+        stats.total_wait += waited
+        stats.max_wait = max(stats.max_wait, waited)
+
+    def _dispatch(self) -> None:
+        """Hands free slots to waiters, highest priority first, round-robin per book."""
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self.active < self._limit_for(priority):
+                fair_key, waiters = queue.popitem(last=False)
+                waiter = waiters.popleft()
+                if waiters:
+                    # Move this book to the back of the line
+                    queue[fair_key] = waiters
+                if waiter.future.done():
+                    continue
+                self._grant(priority, time.monotonic() - waiter.enqueued_at)
+                waiter.future.set_result(None)
+
+    async def acquire(self, priority: str = PRIORITY_INTERACTIVE, book_id: Optional[int] = None) -> None:
+        """Waits until a slot is available for the given priority class."""
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class: {priority}")
+
+        higher_waiting = any(
+            self._has_waiters(p) for p in PRIORITIES[: PRIORITIES.index(priority) + 1]
+        )
+        if not higher_waiting and self.active < self._limit_for(priority):
+            self._grant(priority, 0.0)
+            return
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future())
+        self._queues[priority].setdefault(book_id, deque()).append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was granted just as we were cancelled; give it back
+                self.release()
+            else:
+                self._remove(priority, book_id, waiter)
+            raise
+
+    def _remove(self, priority: str, book_id: Optional[int], waiter: _Waiter) -> None:
+        waiters = self._queues[priority].get(book_id)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            pass
+        if not waiters:
+            del self._queues[priority][book_id]
+
+    def release(self) -> None:
+        """Frees a slot and wakes up the next waiter."""
+        self.active = max(0, self.active - 1)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: str = PRIORITY_INTERACTIVE, book_id: Optional[int] = None):
+        """Holds a backend slot for the duration of the block."""
+        started = time.monotonic()
+        await self.acquire(priority, book_id)
+        waited = time.monotonic() - started
+        if waited > 1:
+            logging.info(f"LLM call ({priority}, book {book_id}) waited {waited:.1f}s for a slot")
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        """Active slots, queue depths and wait times per priority class."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "reserved_interactive_slots": self.reserved_interactive_slots,
+            "active": self.active,
+            "priorities": {
+                priority: {
+                    "queued": self._queue_depth(priority),
+                    "granted": stats.granted,
+                    "avg_wait_seconds": round(stats.total_wait / stats.granted, 3) if stats.granted else 0.0,
+                    "max_wait_seconds": round(stats.max_wait, 3),
+                }
+                for priority, stats in self._stats.items()
+            },
+        }
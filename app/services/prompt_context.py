@@ -0,0 +1,297 @@
+"""Per-book prompt context and the selection of characters for chapter prompts."""
+
+import json
+import logging
+import math
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from app import config
+from app.utils.text_parser import estimate_tokens
+
+_WORD_PATTERN = re.compile(r"[^\W\d_]{3,}")
+# Frequent words that say nothing about which characters a chapter is about
+_STOPWORDS = frozenset(
+    "the and for with that this from into they them their his her him she you your was were are has have had "
+    "not but who whom what when where which while will would could should about after before over under "
+    "again then than there these those other some such only also very just more most each upon".split()
+)
+
+
+def _words(text: Optional[str]) -> set:
+    return {word for word in _WORD_PATTERN.findall((text or "").lower()) if word not in _STOPWORDS}
+
+
+def format_character_sheet(char) -> str:
+    """The full description of a character for a chapter prompt."""
+    return (
+        f"<name>{char.name}</name>"
+        + f"<role>{'protagonist' if char.is_protagonist else 'supporting'}</role>"
+        + f"<summary>{char.description}</summary>"
+        + f"<dialogue_voice>{char.dialogue_voice}</dialogue_voice>"
+        + f"<relationships>{char.relationships}</relationships>"
+        + f"<role_potential>{char.role_potential}</role_potential>"
+        + f"<story_arc>{char.story_arc}</story_arc>"
+    )
+
+
+def format_character_stub(char) -> str:
+    """A one-line description of a character the chapter is not about."""
+    summary = char.summary or char.description or ""
+    first_sentence = re.split(r"(?<=[.!?])\s", summary.strip(), maxsplit=1)[0]
+    return (
+        f"<name>{char.name}</name>"
+        + f"<role>{'protagonist' if char.is_protagonist else 'supporting'}</role>"
+        + f"<summary>{first_sentence}</summary>"
+    )
+
+
+@dataclass
+class CharacterProfile:
+    """
+    What chapter prompts need of a character, assembled once per book version:
+    the rendered sheet and stub and the words used to score relevance.
+    """
+    name: str
+    is_protagonist: bool
+    sheet: str
+    stub: str
+    name_words: FrozenSet[str]
+    sheet_words: FrozenSet[str]
+    embedding_text: str
+
+    @classmethod
+    def from_character(cls, char) -> "CharacterProfile":
+        return cls(
+            name=char.name,
+            is_protagonist=bool(char.is_protagonist),
+            sheet=format_character_sheet(char),
+            stub=format_character_stub(char),
+            name_words=frozenset(_words(char.name)),
+            sheet_words=frozenset(
+                _words(" ".join(filter(None, (char.description, char.relationships, char.role_potential))))
+            ),
+            embedding_text=f"{char.name}: {char.description}",
+        )
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+@dataclass
+class CharacterSelection:
+    """Characters of a chapter prompt, split into full sheets and stubs."""
+    full: List[CharacterProfile] = field(default_factory=list)
+    stubs: List[CharacterProfile] = field(default_factory=list)
+    # Relevance score of every character by name
+    scores: Dict[str, float] = field(default_factory=dict)
+
+    def render(self) -> str:
+        return "\n".join([char.sheet for char in self.full] + [char.stub for char in self.stubs])
+
+
+def score_characters(
+    characters: List[CharacterProfile],
+    query: str,
+    query_vector: Optional[Sequence[float]] = None,
+    character_vectors: Optional[List[Sequence[float]]] = None,
+) -> Dict[str, float]:
+    """
+    Scores how relevant each character is to a chapter described by `query`
+    (synopsis and events). A mention of the character's name (or one of its
+    parts) counts most; the rest is the share of the character's distinctive
+    words found in the query and, with vectors, the embedding similarity.
+    """
+    query_lower = (query or "").lower()
+    query_words = _words(query)
+    scores: Dict[str, float] = {}
+    for i, char in enumerate(characters):
+        score = 0.0
+        if char.name and re.search(rf"\b{re.escape(char.name.lower())}\b", query_lower):
+            score += 2.0
+        elif char.name_words & query_words:
+            score += 1.5
+
+        if char.sheet_words:
+            score += len(char.sheet_words & query_words) / math.sqrt(len(char.sheet_words))
+
+        if query_vector is not None and character_vectors is not None:
+            score += max(0.0, _cosine(query_vector, character_vectors[i]))
+        scores[char.name] = score
+    return scores
+
+
+def select_characters(characters: List[CharacterProfile], scores: Dict[str, float]) -> CharacterSelection:
+    """
+    Keeps full sheets for protagonists and the CHARACTER_CONTEXT_MAX_FULL most
+    relevant characters scoring at least CHARACTER_CONTEXT_MIN_SCORE; the other
+    characters get a stub. Casts of up to CHARACTER_CONTEXT_MIN_CAST characters
+    are always included in full.
+    """
+    if len(characters) <= config.CHARACTER_CONTEXT_MIN_CAST:
+        return CharacterSelection(full=list(characters), scores=scores)
+
+    ranked = sorted(
+        (char for char in characters if not char.is_protagonist),
+        key=lambda char: scores.get(char.name, 0.0),
+        reverse=True,
+    )
+    relevant = {
+        id(char) for char in ranked[:config.CHARACTER_CONTEXT_MAX_FULL]
+        if scores.get(char.name, 0.0) >= config.CHARACTER_CONTEXT_MIN_SCORE
+    }
+    selection = CharacterSelection(scores=scores)
+    # Keep the book's character order within each group so prompts stay stable
+    for char in characters:
+        if char.is_protagonist or id(char) in relevant:
+            selection.full.append(char)
+        else:
+            selection.stubs.append(char)
+    return selection
+
+
+class PromptContextStats:
+    """Counts the prompt tokens saved by character selection."""
+
+    def __init__(self):
+        self.prompts = 0
+        self.full_sheets = 0
+        self.stubs = 0
+        self.tokens_full = 0
+        self.tokens_selected = 0
+
+    def record(self, selection: CharacterSelection, tokens_full: int, tokens_selected: int) -> None:
+        self.prompts += 1
+        self.full_sheets += len(selection.full)
+        self.stubs += len(selection.stubs)
+        self.tokens_full += tokens_full
+        self.tokens_selected += tokens_selected
+
+    def stats(self) -> dict:
+        saved = self.tokens_full - self.tokens_selected
+        return {
+            "prompts": self.prompts,
+            "full_sheets": self.full_sheets,
+            "stubs": self.stubs,
+            "tokens_saved": saved,
+            "avg_tokens_saved": round(saved / self.prompts, 1) if self.prompts else 0.0,
+            "saved_ratio": round(saved / self.tokens_full, 3) if self.tokens_full else 0.0,
+        }
+
+
+def render_character_context(selection: CharacterSelection, tokens_full: int) -> Tuple[str, int]:
+    """
+    Renders a selection and records it in prompt_context_stats. Returns the
+    text and the tokens it saved over the full sheets of all characters
+    (`tokens_full`).
+    """
+    rendered = selection.render()
+    tokens_selected = estimate_tokens(rendered)
+    prompt_context_stats.record(selection, tokens_full, tokens_selected)
+    return rendered, tokens_full - tokens_selected
+
+
+def chapter_events_by_number(llm_concept) -> Dict[int, str]:
+    """Maps chapter numbers to the formatted event list of the chapter in a book concept."""
+    concept_data = json.loads(llm_concept) if isinstance(llm_concept, str) else llm_concept
+    events_by_number: Dict[int, str] = {}
+    for chapter_data in (concept_data or {}).get("chapters", []):
+        events = chapter_data.get("chapter_events", [])
+        if events:
+            events_by_number[chapter_data.get("chapter_number")] = "\n".join(
+                f"• {event.get('event_title', '')}: {event.get('event_description', '')}" for event in events
+            )
+    return events_by_number
+
+
+@dataclass
+class BookPromptContext:
+    """The parts of a chapter prompt that only change with the book's version."""
+    book_id: int
+    version: int
+    world_description: Optional[str]
+    user_prompt: Optional[str]
+    characters: List[CharacterProfile]
+    # Estimated tokens of the full sheets of all characters
+    character_tokens: int
+    events_by_chapter: Dict[int, str]
+
+    @classmethod
+    def build(cls, book_id: int, version: int, world_description, user_prompt, llm_concept, characters) -> "BookPromptContext":
+        try:
+            events_by_chapter = chapter_events_by_number(llm_concept)
+        except (json.JSONDecodeError, AttributeError, KeyError, TypeError) as e:
+            logging.warning(f"Error parsing chapter events of book {book_id}: {e}")
+            events_by_chapter = {}
+        profiles = [CharacterProfile.from_character(char) for char in characters]
+        return cls(
+            book_id=book_id,
+            version=version,
+            world_description=world_description,
+            user_prompt=user_prompt,
+            characters=profiles,
+            character_tokens=estimate_tokens("\n".join(profile.sheet for profile in profiles)),
+            events_by_chapter=events_by_chapter,
+        )
+
+
+class BookContextCache:
+    """
+    LRU cache of BookPromptContext by book. An entry is only used while its
+    version matches the book's current version, so any change to the
+    characters, world or concept (which bumps Book.version) invalidates it,
+    also when made by another process.
+    """
+
+    def __init__(self, max_books: int):
+        self.max_books = max_books
+        self._entries: "OrderedDict[int, BookPromptContext]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, book_id: int, version: int) -> Optional[BookPromptContext]:
+        entry = self._entries.get(book_id)
+        if entry is not None and entry.version == version:
+            self._entries.move_to_end(book_id)
+            self.hits += 1
+            return entry
+        if entry is not None:
+            del self._entries[book_id]
+            self.stale += 1
+        self.misses += 1
+        return None
+
+    def put(self, entry: BookPromptContext) -> None:
+        if self.max_books <= 0:
+            return
+        self._entries[entry.book_id] = entry
+        self._entries.move_to_end(entry.book_id)
+        while len(self._entries) > self.max_books:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, book_id: int) -> None:
+        self._entries.pop(book_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "books": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stale": self.stale,
+            "evictions": self.evictions,
+        }
+
+
+# Global instance
+prompt_context_stats = PromptContextStats()
+book_context_cache = BookContextCache(config.BOOK_CONTEXT_CACHE_SIZE)
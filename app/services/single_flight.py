@@ -0,0 +1,143 @@
+"""Coalescing of identical in-flight calls and fan-out of shared streams."""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class BroadcastStream:
+    """
+    Buffers the items of a single producer and replays them to any number of
+    subscribers. Each item gets a sequence number (its index in the buffer), so
+    a subscriber can join late or resume from any point and then follow live.
+    """
+
+    def __init__(self, on_idle: Optional[Callable[[], None]] = None):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        # Called when the last subscriber leaves before the stream is done
+        self.on_idle = on_idle
+        self._wakeup = asyncio.Event()
+
+    def _notify(self) -> None:
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    def publish(self, item: Any) -> int:
+        """Appends an item and wakes up subscribers. Returns its sequence number."""
+        if self.done:
+            raise RuntimeError("Cannot publish to a closed stream.")
+        self.items.append(item)
+        self._notify()
+        return len(self.items) - 1
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        """Marks the stream as finished, optionally with an error for subscribers."""
+        if self.done:
+            return
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def subscribe(self, start: int = 0) -> AsyncIterator[Tuple[int, Any]]:
+        """Yields (sequence, item) pairs from `start` on until the stream is closed."""
+        index = max(0, start)
+        self.subscribers += 1
+        try:
+            while True:
+                while index < len(self.items):
+                    yield index, self.items[index]
+                    index += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._wakeup.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done and self.on_idle is not None:
+                self.on_idle()
+
+
+class SingleFlight:
+    """
+    Ensures only one call per key is in flight. Later callers with the same key
+    await the result of the call that is already running instead of starting a
+    new one. The call runs in its own task, so a cancelled caller does not
+    cancel the work the other callers are waiting for.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, BroadcastStream] = {}
+        self.calls_started = 0
+        self.calls_coalesced = 0
+        self.streams_started = 0
+        self.streams_coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Runs `fn()` unless a call with the same key is in flight, then awaits it."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            self.calls_started += 1
+            task.add_done_callback(lambda t: self._forget_call(key, t))
+        else:
+            self.calls_coalesced += 1
+            logging.info(f"Coalesced duplicate LLM call {key[:12]}")
+        return await asyncio.shield(task)
+
+    def _forget_call(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    async def stream(self, key: str, fn: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Iterates `fn()` unless a stream with the same key is in flight, in which
+        case the caller attaches to it and receives every item from the start.
+        The upstream is cancelled once all subscribers have gone away.
+        """
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = BroadcastStream()
+            self._streams[key] = stream
+            self.streams_started += 1
+            task = asyncio.create_task(self._pump(key, stream, fn))
+            stream.on_idle = task.cancel
+        else:
+            self.streams_coalesced += 1
+            logging.info(f"Attached to in-flight LLM stream {key[:12]}")
+
+        async for _, item in stream.subscribe():
+            yield item
+
+    async def _pump(self, key: str, stream: BroadcastStream, fn: Callable[[], AsyncIterator[Any]]) -> None:
+        try:
+            async for item in fn():
+                stream.publish(item)
+            stream.close()
+        except asyncio.CancelledError:
+            stream.close(RuntimeError("Upstream stream was cancelled."))
+            raise
+        except Exception as e:
+            stream.close(e)
+        finally:
+            if self._streams.get(key) is stream:
+                del self._streams[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Counters of started and coalesced calls and streams."""
+        return {
+            "calls_started": self.calls_started,
+            "calls_coalesced": self.calls_coalesced,
+            "calls_in_flight": len(self._calls),
+            "streams_started": self.streams_started,
+            "streams_coalesced": self.streams_coalesced,
+            "streams_in_flight": len(self._streams),
+        }
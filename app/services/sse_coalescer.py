@@ -0,0 +1,142 @@
+"""Coalescing of small stream chunks into fewer, larger SSE frames."""
+
+import asyncio
+import itertools
+import time
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+
+class StreamMetrics:
+    """Frame counters of one coalesced stream."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.started_at = time.monotonic()
+        self.chunks = 0
+        self.frames = 0
+        self.bytes = 0
+
+    def record_frame(self, chunks: int, size: int) -> None:
+        self.chunks += chunks
+        self.frames += 1
+        self.bytes += size
+
+    def snapshot(self) -> dict:
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        return {
+            "stream": self.label,
+            "seconds": round(elapsed, 1),
+            "chunks": self.chunks,
+            "frames": self.frames,
+            "frames_per_second": round(self.frames / elapsed, 2),
+            "bytes_per_frame": round(self.bytes / self.frames, 1) if self.frames else 0.0,
+            "chunks_per_frame": round(self.chunks / self.frames, 2) if self.frames else 0.0,
+        }
+
+
+class StreamMetricsRegistry:
+    """Keeps the metrics of active streams and totals of finished ones."""
+
+    def __init__(self):
+        self._active: Dict[int, StreamMetrics] = {}
+        self._ids = itertools.count()
+        self.finished_streams = 0
+        self.finished_chunks = 0
+        self.finished_frames = 0
+        self.finished_bytes = 0
+
+    def open(self, label: str) -> Tuple[int, StreamMetrics]:
+        stream_id = next(self._ids)
+        metrics = StreamMetrics(label)
+        self._active[stream_id] = metrics
+        return stream_id, metrics
+
+    def close(self, stream_id: int) -> None:
+        metrics = self._active.pop(stream_id, None)
+        if metrics is None:
+            return
+        self.finished_streams += 1
+        self.finished_chunks += metrics.chunks
+        self.finished_frames += metrics.frames
+        self.finished_bytes += metrics.bytes
+
+    def stats(self) -> dict:
+        """Per-stream frame rates of active streams and totals of finished ones."""
+        frames = self.finished_frames
+        return {
+            "active": [metrics.snapshot() for metrics in self._active.values()],
+            "finished_streams": self.finished_streams,
+            "finished_frames": frames,
+            "finished_bytes_per_frame": round(self.finished_bytes / frames, 1) if frames else 0.0,
+            "finished_chunks_per_frame": round(self.finished_chunks / frames, 2) if frames else 0.0,
+        }
+
+
+async def coalesce_chunks(
+    source: AsyncIterator[Tuple[int, str]],
+    max_bytes: int,
+    max_delay: float,
+    metrics: Optional[StreamMetrics] = None,
+) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Merges consecutive (sequence, text) chunks of `source` into frames. A frame
+    is flushed once it holds `max_bytes` bytes of UTF-8 text, or `max_delay`
+    seconds after its first chunk arrived, whichever comes first. Each frame
+    carries the sequence number of its last chunk, so a client resuming after
+    that frame continues with the first chunk it has not seen.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = source.__aiter__()
+    pending: Optional[asyncio.Future] = None
+    parts = []
+    size = 0
+    last_seq = -1
+    deadline: Optional[float] = None
+
+    def take_frame() -> Tuple[int, str]:
+        nonlocal parts, size, deadline
+        frame = "".join(parts)
+        if metrics is not None:
+            metrics.record_frame(len(parts), size)
+        parts, size, deadline = [], 0, None
+        return last_seq, frame
+
+    try:
+        while True:
+            if pending is None:
+                # The read is kept across flushes; cancelling it would abort the source
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if done:
+                read, pending = pending, None
+                try:
+                    seq, chunk = read.result()
+                except StopAsyncIteration:
+                    break
+                except Exception:
+                    if parts:
+                        yield take_frame()
+                    raise
+                if not parts:
+                    deadline = loop.time() + max_delay
+                parts.append(chunk)
+                size += len(chunk.encode("utf-8"))
+                last_seq = seq
+                if size < max_bytes:
+                    continue
+            if parts:
+                yield take_frame()
+        if parts:
+            yield take_frame()
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+# Global instance
+chapter_stream_metrics = StreamMetricsRegistry()
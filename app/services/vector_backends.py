@@ -0,0 +1,445 @@
+"""
+Storage backends for the vector store.
+
+A backend keeps named collections of (id, text, metadata, vector) records and
+answers nearest-neighbour queries; embedding the texts is left to the caller.
+Filters use a small subset of Chroma's `where` syntax: `{"field": value}`,
+`{"field": {"$lt": value}}` (also `$lte`, `$gt`, `$gte`, `$ne`) and
+`{"$and": [...]}`.
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+# (document, similarity) pairs, most similar first; similarity is cosine, higher is closer
+SearchResults = List[Tuple[Document, float]]
+
+_COMPARISONS = {
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$ne": lambda a, b: a != b,
+    "$eq": lambda a, b: a == b,
+}
+
+
+_CURRENT = "CURRENT"
+_GENERATION_PREFIX = "gen-"
+
+
+def _write_records(path: str, records: List[dict]) -> None:
+    """Replaces a record log atomically."""
+    with open(path + ".tmp", "w", encoding="utf-8") as out:
+        for record in records:
+            out.write(json.dumps(record) + "\n")
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def matches_filter(metadata: dict, where: Optional[dict]) -> bool:
+    """Evaluates a `where` filter against the metadata of one record."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if value is None or not _COMPARISONS[operator](value, operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class VectorBackend(ABC):
+    """Interface of the vector storage backends."""
+
+    @abstractmethod
+    def upsert(
+        self,
+        collection: str,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+        metadatas: Sequence[dict],
+    ) -> None:
+        """Adds records, replacing records with the same ids."""
+
+    @abstractmethod
+    def delete(self, collection: str, where: dict) -> None:
+        """Deletes the records matching `where`."""
+
+    @abstractmethod
+    def query(self, collection: str, vector: Sequence[float], k: int, where: Optional[dict] = None) -> SearchResults:
+        """Returns the `k` records most similar to `vector` that match `where`."""
+
+    @abstractmethod
+    def count(self, collection: str, where: Optional[dict] = None) -> int:
+        """Returns the number of records matching `where`."""
+
+    @abstractmethod
+    def drop(self, collection: str) -> None:
+        """Deletes a collection and everything in it."""
+
+    def close(self) -> None:
+        """Releases files and clients."""
+
+
+class _NumpyCollection:
+    """
+    One collection of NumpyBackend, stored in its own directory as
+    `vectors.f32` (a float32 matrix, one row per record, appended to) and
+    `records.jsonl` (an append-only log of added and deleted records).
+    A row is live while it is the latest row of its id.
+
+    Compaction writes both files into a new generation directory and then
+    points `CURRENT` at it, so a crash leaves either the old or the new pair.
+    Without `CURRENT` the files are in the collection directory itself.
+    """
+
+    def __init__(self, path: str):
+        import numpy as np
+
+        self.np = np
+        self.path = path
+        self.generation = self._read_generation()
+        self.dim: Optional[int] = None
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self.latest: Dict[str, int] = {}
+        self._matrix = None
+        self._norms = None
+        self._load()
+
+    def _read_generation(self) -> str:
+        try:
+            with open(os.path.join(self.path, _CURRENT), encoding="utf-8") as current:
+                return current.read().strip()
+        except FileNotFoundError:
+            return ""
+
+    @property
+    def data_path(self) -> str:
+        return os.path.join(self.path, self.generation) if self.generation else self.path
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.data_path, "vectors.f32")
+
+    @property
+    def records_path(self) -> str:
+        return os.path.join(self.data_path, "records.jsonl")
+
+    def _remove_stale_generations(self) -> None:
+        """Deletes generations left behind by a compaction that did not finish."""
+        if not os.path.isdir(self.path):
+            return
+        for entry in os.listdir(self.path):
+            if entry.startswith(_GENERATION_PREFIX) and entry != self.generation:
+                shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+
+    def _load(self) -> None:
+        self._remove_stale_generations()
+        if not os.path.exists(self.records_path):
+            return
+        with open(self.records_path, encoding="utf-8") as records:
+            log = [json.loads(line) for line in records if line.strip()]
+        dim = next((record["dim"] for record in log if record["op"] == "add"), None)
+        vector_bytes = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        stored_rows = vector_bytes // (dim * 4) if dim else 0
+
+        kept = []
+        for record in log:
+            if record["op"] == "add":
+                # Log rows past the end of the vectors (missing or shorter file) have nothing to search
+                if len(self.ids) >= stored_rows:
+                    continue
+                self.latest[record["id"]] = len(self.ids)
+                self.ids.append(record["id"])
+                self.texts.append(record["text"])
+                self.metadatas.append(record["metadata"])
+            else:
+                for record_id in record["ids"]:
+                    self.latest.pop(record_id, None)
+            kept.append(record)
+        if self.ids:
+            self.dim = dim
+        if len(kept) < len(log):
+            logging.warning(
+                f"Dropped {len(log) - len(kept)} records without vectors from {self.records_path}"
+            )
+            _write_records(self.records_path, kept)
+        # Rows written without their log entry (interrupted append) are ignored
+        if vector_bytes > len(self.ids) * (self.dim or 0) * 4:
+            with open(self.vectors_path, "r+b") as vectors:
+                vectors.truncate(len(self.ids) * (self.dim or 0) * 4)
+
+    @property
+    def dead_rows(self) -> int:
+        return len(self.ids) - len(self.latest)
+
+    def _live(self, row: int) -> bool:
+        return self.latest.get(self.ids[row]) == row
+
+    def matrix(self):
+        """The vectors as a read-only memory map, with their norms."""
+        if self._matrix is None and self.ids:
+            np = self.np
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.ids), self.dim))
+            self._norms = np.linalg.norm(self._matrix, axis=1)
+        return self._matrix, self._norms
+
+    def append(self, ids, texts, vectors, metadatas) -> None:
+        np = self.np
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or len(matrix) != len(ids):
+            raise ValueError("Expected one vector per id")
+        if self.dim is not None and matrix.shape[1] != self.dim:
+            raise ValueError(f"Vectors have {matrix.shape[1]} dimensions, the collection has {self.dim}")
+        os.makedirs(self.data_path, exist_ok=True)
+        # Vectors first: rows without a log entry are dropped on load
+        with open(self.vectors_path, "ab") as out:
+            out.write(matrix.tobytes())
+        with open(self.records_path, "a", encoding="utf-8") as out:
+            for record_id, text, metadata in zip(ids, texts, metadatas):
+                out.write(json.dumps(
+                    {"op": "add", "id": record_id, "text": text, "metadata": metadata, "dim": matrix.shape[1]}
+                ) + "\n")
+        self.dim = matrix.shape[1]
+        for record_id, text, metadata in zip(ids, texts, metadatas):
+            self.latest[record_id] = len(self.ids)
+            self.ids.append(record_id)
+            self.texts.append(text)
+            self.metadatas.append(metadata)
+        self._matrix = self._norms = None
+
+    def remove(self, where: dict) -> None:
+        removed = [
+            record_id for record_id, row in self.latest.items() if matches_filter(self.metadatas[row], where)
+        ]
+        if not removed:
+            return
+        with open(self.records_path, "a", encoding="utf-8") as out:
+            out.write(json.dumps({"op": "delete", "ids": removed}) + "\n")
+        for record_id in removed:
+            del self.latest[record_id]
+        if self.dead_rows > len(self.latest):
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrites both files with the live rows only, into a new generation."""
+        np = self.np
+        rows = sorted(self.latest.values())
+        matrix, _ = self.matrix()
+        live = np.array(matrix[rows], dtype=np.float32) if rows else np.zeros((0, self.dim or 0), np.float32)
+        self._matrix = self._norms = None
+
+        previous_path = self.data_path
+        number = int(self.generation[len(_GENERATION_PREFIX):]) + 1 if self.generation else 1
+        generation = f"{_GENERATION_PREFIX}{number}"
+        generation_path = os.path.join(self.path, generation)
+        shutil.rmtree(generation_path, ignore_errors=True)
+        os.makedirs(generation_path)
+        with open(os.path.join(generation_path, "vectors.f32"), "wb") as out:
+            out.write(live.tobytes())
+            out.flush()
+            os.fsync(out.fileno())
+        _write_records(os.path.join(generation_path, "records.jsonl"), [
+            {"op": "add", "id": self.ids[row], "text": self.texts[row], "metadata": self.metadatas[row], "dim": self.dim}
+            for row in rows
+        ])
+        # Switching CURRENT is the commit point of the compaction
+        current_path = os.path.join(self.path, _CURRENT)
+        with open(current_path + ".tmp", "w", encoding="utf-8") as out:
+            out.write(generation)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(current_path + ".tmp", current_path)
+        self.generation = generation
+
+        if previous_path == self.path:
+            for name in ("vectors.f32", "records.jsonl"):
+                if os.path.exists(os.path.join(self.path, name)):
+                    os.remove(os.path.join(self.path, name))
+        else:
+            shutil.rmtree(previous_path, ignore_errors=True)
+        self.ids = [self.ids[row] for row in rows]
+        self.texts = [self.texts[row] for row in rows]
+        self.metadatas = [self.metadatas[row] for row in rows]
+        self.latest = {record_id: row for row, record_id in enumerate(self.ids)}
+
+    def count(self, where: Optional[dict]) -> int:
+        return sum(1 for row in self.latest.values() if matches_filter(self.metadatas[row], where))
+
+    def search(self, vector, k: int, where: Optional[dict]) -> SearchResults:
+        np = self.np
+        if not self.latest or k <= 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        if query_norm == 0.0:
+            return []
+        rows = np.fromiter(
+            (row for row in self.latest.values() if matches_filter(self.metadatas[row], where)), dtype=np.int64
+        )
+        if rows.size == 0:
+            return []
+        matrix, norms = self.matrix()
+        scores = (matrix[rows] @ query) / np.maximum(norms[rows] * query_norm, 1e-12)
+        if rows.size > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(rows.size)
+        top = top[np.argsort(-scores[top])]
+        return [
+            (Document(page_content=self.texts[rows[i]], metadata=self.metadatas[rows[i]], id=self.ids[rows[i]]),
+             float(scores[i]))
+            for i in top
+        ]
+
+
+class NumpyBackend(VectorBackend):
+    """
+    In-process backend for small collections: every collection is a
+    memory-mapped float32 matrix searched by exact, vectorized cosine
+    similarity, with an append-only log of ids, texts and metadata.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._collections: Dict[str, _NumpyCollection] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, collection: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", collection))
+
+    def _collection(self, collection: str) -> _NumpyCollection:
+        loaded = self._collections.get(collection)
+        if loaded is None:
+            loaded = _NumpyCollection(self._path(collection))
+            self._collections[collection] = loaded
+        return loaded
+
+    def upsert(self, collection, ids, texts, vectors, metadatas) -> None:
+        if not ids:
+            return
+        with self._lock:
+            self._collection(collection).append(ids, texts, vectors, metadatas)
+
+    def delete(self, collection, where) -> None:
+        with self._lock:
+            self._collection(collection).remove(where)
+
+    def query(self, collection, vector, k, where=None) -> SearchResults:
+        with self._lock:
+            return self._collection(collection).search(vector, k, where)
+
+    def count(self, collection, where=None) -> int:
+        with self._lock:
+            return self._collection(collection).count(where)
+
+    def drop(self, collection) -> None:
+        with self._lock:
+            self._collections.pop(collection, None)
+            shutil.rmtree(self._path(collection), ignore_errors=True)
+
+    def close(self) -> None:
+        with self._lock:
+            self._collections = {}
+
+
+class ChromaBackend(VectorBackend):
+    """Backend storing collections in a persistent Chroma database."""
+
+    def __init__(self, directory: str):
+        # Imported here so the default backend never loads chromadb
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=directory)
+
+    def _collection(self, collection: str):
+        # Only applies to new collections; existing ones keep their space
+        return self.client.get_or_create_collection(collection, metadata={"hnsw:space": "cosine"})
+
+    @staticmethod
+    def _similarity(distance: float, space: str) -> float:
+        """
+        Converts a Chroma distance to cosine similarity. Collections created
+        through langchain_chroma use squared L2 distance; for the unit-length
+        vectors of the embedding model that is 2 - 2 * cosine.
+        """
+        if space == "l2":
+            return 1.0 - distance / 2.0
+        # "cosine" is 1 - cosine; "ip" is 1 - dot product, the cosine for unit vectors
+        return 1.0 - distance
+
+    def upsert(self, collection, ids, texts, vectors, metadatas) -> None:
+        if not ids:
+            return
+        self._collection(collection).upsert(
+            ids=list(ids), documents=list(texts), embeddings=[list(v) for v in vectors], metadatas=list(metadatas)
+        )
+
+    def delete(self, collection, where) -> None:
+        self._collection(collection).delete(where=where)
+
+    def query(self, collection, vector, k, where=None) -> SearchResults:
+        target = self._collection(collection)
+        count = target.count()
+        if count == 0 or k <= 0:
+            return []
+        result = target.query(
+            query_embeddings=[list(vector)],
+            n_results=min(k, count),
+            where=where or None,
+            include=["documents", "metadatas", "distances"],
+        )
+        space = (target.metadata or {}).get("hnsw:space", "l2")
+        return [
+            (Document(page_content=text, metadata=metadata or {}, id=record_id), self._similarity(distance, space))
+            for record_id, text, metadata, distance in zip(
+                result["ids"][0], result["documents"][0], result["metadatas"][0], result["distances"][0]
+            )
+        ]
+
+    def count(self, collection, where=None) -> int:
+        target = self._collection(collection)
+        if not where:
+            return target.count()
+        return len(target.get(where=where, include=[])["ids"])
+
+    def drop(self, collection) -> None:
+        try:
+            self.client.delete_collection(collection)
+        except Exception as e:
+            # Collections that were never written to do not exist
+            logging.debug(f"No Chroma collection {collection} to delete: {e}")
+
+    def close(self) -> None:
+        if hasattr(self.client, "clear_system_cache"):
+            self.client.clear_system_cache()
+        self.client = None
+
+
+def create_vector_backend(name: str, directory: str) -> VectorBackend:
+    """Creates the backend selected by VECTOR_BACKEND ("numpy" or "chroma")."""
+    if name == "numpy":
+        return NumpyBackend(os.path.join(directory, "numpy"))
+    if name == "chroma":
+        return ChromaBackend(directory)
+    raise ValueError(f"Unknown vector backend: {name}")
@@ -1,49 +1,190 @@
-"""Vector database operations for character storage and retrieval."""
+"""Vector database operations: per-book storage and retrieval of characters and chapters."""
+import logging
 import os
+import threading
+from typing import List, Optional
+
 os.environ["ANONYMIZED_TELEMETRY"] = "False"
 
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.documents import Document
 from app import config
 from app.models.data_models import CharacterCollection
+from app.services.embedding_cache import CachedEmbeddings
+from app.services.vector_backends import SearchResults, VectorBackend, create_vector_backend
+
+
+def chunk_text(text: str, chunk_chars: int, overlap_chars: int) -> List[str]:
+    """
+    Splits text into chunks of about `chunk_chars` characters along paragraph
+    boundaries. Consecutive chunks share up to `overlap_chars` characters of
+    trailing paragraphs so passages are not cut off from their context.
+    """
+    paragraphs = [p.strip() for p in text.replace("-----", "\n").split("\n") if p.strip()]
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for paragraph in paragraphs:
+        if current and size + len(paragraph) > chunk_chars:
+            chunks.append("\n".join(current))
+            # Carry trailing paragraphs over as overlap
+            overlap: List[str] = []
+            overlap_size = 0
+            for previous in reversed(current):
+                if overlap_size + len(previous) > overlap_chars:
+                    break
+                overlap.insert(0, previous)
+                overlap_size += len(previous)
+            current, size = overlap, overlap_size
+        current.append(paragraph)
+        size += len(paragraph)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
 
 
 class VectorStoreService:
-    """Service for managing character embeddings and retrieval."""
+    """
+    Service for managing embeddings and retrieval. Every book has its own
+    collection holding its characters and the chunks of its completed chapters.
+    Texts are embedded here; storage and search are done by the backend
+    selected with VECTOR_BACKEND.
+    """
 
     def __init__(self):
-        self.embeddings = OpenAIEmbeddings(
+        # Imported here so that processes which never touch embeddings do not
+        # pay for loading the embedding client and the backend.
+        from langchain_openai import OpenAIEmbeddings
+
+        self.embeddings = CachedEmbeddings(
+            OpenAIEmbeddings(
+                model=config.EMBEDDING_MODEL,
+                api_key=config.OPENAI_API_KEY,
+                base_url=config.OPENAI_API_BASE,
+                chunk_size=config.EMBEDDING_BATCH_SIZE,
+            ),
             model=config.EMBEDDING_MODEL,
-            api_key=config.OPENAI_API_KEY,
-            base_url=config.OPENAI_API_BASE,
+            sqlite_path=config.EMBEDDING_CACHE_SQLITE_PATH,
+            batch_size=config.EMBEDDING_BATCH_SIZE,
         )
-        self.vector_store = Chroma(
-            collection_name=config.COLLECTION_NAME,
-            persist_directory=config.DB_LOCATION,
-            embedding_function=self.embeddings,
-        )
-    
-    def embed_characters(self, characters: CharacterCollection) -> None:
+        self.backend: Optional[VectorBackend] = create_vector_backend(config.VECTOR_BACKEND, config.DB_LOCATION)
+
+    @staticmethod
+    def collection_name(book_id: Optional[int]) -> str:
+        """Name of the collection of a book (the shared legacy one without a book)."""
+        return config.COLLECTION_NAME if book_id is None else f"{config.BOOK_COLLECTION_PREFIX}{book_id}"
+
+    def _add(self, book_id: Optional[int], ids: List[str], texts: List[str], metadatas: List[dict]) -> None:
+        vectors = self.embeddings.embed_documents(texts)
+        self.backend.upsert(self.collection_name(book_id), ids, texts, vectors, metadatas)
+
+    def _search(self, book_id: Optional[int], query: str, k: int, where: dict) -> SearchResults:
+        vector = self.embeddings.embed_query(query)
+        return self.backend.query(self.collection_name(book_id), vector, k, where)
+
+    def embed_characters(self, characters: CharacterCollection, book_id: Optional[int] = None) -> None:
         """Embed characters into the vector store."""
-        documents = []
-        ids = []
-        
-        for i, char in enumerate(characters.chars):
-            document = Document(
-                page_content=f"name: {char.name}, role:{char.role} summary:{char.summary}",
-                metadata={"name": char.name, "role": char.role},
-                id=str(i)
-            )
-            ids.append(str(i))
-            documents.append(document)
-        
-        self.vector_store.add_documents(documents=documents, ids=ids)
+        self._add(
+            book_id,
+            ids=[f"character-{i}" for i in range(len(characters.chars))],
+            texts=[f"name: {char.name}, role:{char.role} summary:{char.summary}" for char in characters.chars],
+            metadatas=[{"kind": "character", "name": char.name, "role": char.role} for char in characters.chars],
+        )
     
-    def get_character_context(self, query: str = "Tell me more about the persons in this book") -> str:
+    def get_character_context(
+        self, query: str = "Tell me more about the persons in this book", book_id: Optional[int] = None
+    ) -> str:
         """Retrieve character context for AI prompts."""
-        retriever = self.vector_store.as_retriever(
-            search_kwargs={"k": config.RETRIEVER_K}
+        results = self._search(book_id, query, config.RETRIEVER_K, {"kind": "character"})
+        return "\n".join([doc.page_content for doc, _ in results])
+
+    def index_chapter(self, book_id: int, chapter_id: int, chapter_number: int, content: str) -> int:
+        """
+        Replaces the indexed chunks of a chapter with chunks of `content`.
+        Returns the number of chunks indexed.
+        """
+        self.backend.delete(self.collection_name(book_id), {"chapter_id": chapter_id})
+        chunks = chunk_text(content, config.RAG_CHUNK_CHARS, config.RAG_CHUNK_OVERLAP_CHARS)
+        if not chunks:
+            return 0
+        self._add(
+            book_id,
+            ids=[f"chapter-{chapter_id}-{i}" for i in range(len(chunks))],
+            texts=chunks,
+            metadatas=[
+                {"kind": "chapter", "chapter_id": chapter_id, "chapter_number": chapter_number, "chunk": i}
+                for i in range(len(chunks))
+            ],
         )
-        docs = retriever.invoke(query)
-        return "\n".join([doc.page_content for doc in docs])
\ No newline at end of file
+        return len(chunks)
+
+    def is_chapter_indexed(self, book_id: int, chapter_id: int) -> bool:
+        """Whether any chunk of a chapter is in its book's collection."""
+        return self.backend.count(self.collection_name(book_id), {"chapter_id": chapter_id}) > 0
+
+    def search_chapters(self, book_id: int, query: str, before_chapter: int, k: int) -> SearchResults:
+        """Returns the `k` chapter chunks before `before_chapter` most similar to `query`, best first."""
+        return self._search(
+            book_id, query, k, {"$and": [{"kind": "chapter"}, {"chapter_number": {"$lt": before_chapter}}]}
+        )
+
+    def delete_book(self, book_id: int) -> None:
+        """Drops the collection of a book."""
+        self.backend.drop(self.collection_name(book_id))
+
+    def close(self) -> None:
+        """Releases the backend and the embedding client."""
+        if self.backend is not None:
+            self.backend.close()
+        self.backend = None
+        if self.embeddings is not None:
+            self.embeddings.close()
+        self.embeddings = None
+
+
+_vector_store: Optional[VectorStoreService] = None
+_vector_store_lock = threading.Lock()
+_vector_store_enabled = config.VECTOR_STORE_ENABLED
+
+
+def configure_vector_store(enabled: bool) -> None:
+    """Enables or disables the vector store. Called once at startup."""
+    global _vector_store_enabled
+    _vector_store_enabled = enabled
+    if not enabled:
+        logging.info("Vector store is disabled; embedding features will be skipped")
+
+
+def get_vector_store() -> Optional[VectorStoreService]:
+    """
+    Returns the shared VectorStoreService, creating it on first use.
+    Returns None if the vector store is disabled.
+    """
+    global _vector_store
+    if not _vector_store_enabled:
+        return None
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                logging.info("Opening vector store")
+                _vector_store = VectorStoreService()
+    return _vector_store
+
+
+def vector_store_stats() -> Optional[dict]:
+    """Embedding cache counters of the shared vector store, or None if it was not opened."""
+    vector_store = _vector_store
+    if vector_store is None or vector_store.embeddings is None:
+        return None
+    return vector_store.embeddings.stats()
+
+
+def close_vector_store() -> None:
+    """Closes the shared vector store if it was ever opened."""
+    global _vector_store
+    with _vector_store_lock:
+        if _vector_store is not None:
+            try:
+                _vector_store.close()
+            except Exception as e:
+                logging.warning(f"Error closing vector store: {e}")
+            _vector_store = None
+            logging.info("Closed vector store")
@@ -0,0 +1,125 @@
+"""Group commits for small, frequent database writes."""
+
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from sqlalchemy.sql import Executable
+
+from app import config
+from app.database import async_session_maker
+
+# A queued statement and the future of the caller waiting for it
+_Write = Tuple[Executable, asyncio.Future]
+
+
+class GroupCommitWriter:
+    """
+    Runs write statements from many callers through a single worker that
+    commits them in batches: the first write opens a window of
+    WRITE_QUEUE_WINDOW_MS, and everything queued until then (at most
+    WRITE_QUEUE_MAX_BATCH writes) is committed in one transaction, i.e. one
+    fsync. Each caller awaits its own write and gets its own error; if a
+    batch fails, its writes are retried one by one so only the failing one
+    is reported.
+    """
+
+    def __init__(self, window: Optional[float] = None, max_batch: Optional[int] = None):
+        self.window = window if window is not None else config.WRITE_QUEUE_WINDOW_MS / 1000
+        self.max_batch = max(1, max_batch or config.WRITE_QUEUE_MAX_BATCH)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._closed = False
+        self.writes = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.failed_batches = 0
+
+    def start(self) -> None:
+        """Accepts writes again after close(), e.g. in a new application lifespan."""
+        self._closed = False
+        self._queue = None
+        self._worker = None
+
+    async def execute(self, statement: Executable) -> None:
+        """Queues a write statement and waits until it is committed."""
+        if self._closed:
+            raise RuntimeError("The write queue is closed.")
+        if self._worker is None or self._worker.done():
+            self._queue = self._queue or asyncio.Queue()
+            self._worker = asyncio.create_task(self._run(), name="group commit writer")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((statement, future))
+        # A caller that goes away does not take its write with it
+        await asyncio.shield(future)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch: List[_Write] = [first]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    write = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if write is None:
+                    stopping = True
+                    break
+                batch.append(write)
+            await self._commit(batch)
+
+    async def _commit(self, batch: List[_Write]) -> None:
+        try:
+            async with async_session_maker() as session:
+                for statement, _ in batch:
+                    await session.execute(statement)
+                await session.commit()
+        except Exception as e:
+            if len(batch) == 1:
+                _, future = batch[0]
+                if not future.done():
+                    future.set_exception(e)
+                return
+            self.failed_batches += 1
+            logging.warning(f"Group commit of {len(batch)} writes failed ({e}); retrying them one by one")
+            for write in batch:
+                await self._commit([write])
+            return
+
+        self.writes += len(batch)
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    async def close(self) -> None:
+        """Commits everything still queued and stops the worker."""
+        self._closed = True
+        if self._worker is None or self._worker.done():
+            return
+        self._queue.put_nowait(None)
+        await self._worker
+
+    def stats(self) -> dict:
+        """Write and batch counters."""
+        return {
+            "writes": self.writes,
+            "batches": self.batches,
+            "avg_batch_size": round(self.writes / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "failed_batches": self.failed_batches,
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
+
+
+# Global instance
+write_queue = GroupCommitWriter()
@@ -1,32 +1,74 @@
+# Bump whenever the HTML produced for the same text changes; stored renderings
+# of an older version are then ignored and chapters are rendered when viewed
+RENDERER_VERSION = 1
+
+_DIVIDER_HTML = '<hr class="book-section-divider">'
+
+
+def _render_paragraph(paragraph: str) -> str:
+    """
+    Renders one paragraph. The first `**` opens <strong> and every later one
+    closes it; `*` works the same way for <em>. Each marker type takes one
+    partition and one replace, so the cost stays linear in the paragraph
+    length, and paragraphs without markers are only scanned.
+    """
+    if '*' in paragraph:
+        head, marker, rest = paragraph.partition('**')
+        if marker:
+            paragraph = head + '<strong>' + rest.replace('**', '</strong>')
+        head, marker, rest = paragraph.partition('*')
+        if marker:
+            paragraph = head + '<em>' + rest.replace('*', '</em>')
+    if '-----' in paragraph:
+        paragraph = paragraph.replace('-----', _DIVIDER_HTML)
+    return f"<p>{paragraph}</p>"
+
+
 def parse_markdown(text: str) -> str:
     """
     Simple markdown parser for paragraphs, italic, and bold.
     """
     if not text:
         return ""
-    
+
     # Split into paragraphs (single newlines)
-    paragraphs = text.split('\n')
-    
-    formatted_paragraphs = []
-    for paragraph in paragraphs:
-        if not paragraph.strip():
-            continue
-            
-        # Convert **bold** to <strong>bold</strong>
-        parsed = paragraph.replace('**', '<strong>', 1)
-        while '**' in parsed:
-            parsed = parsed.replace('**', '</strong>', 1)
-        
-        # Convert *italic* to <em>italic</em>
-        parsed = parsed.replace('*', '<em>', 1)
-        while '*' in parsed:
-            parsed = parsed.replace('*', '</em>', 1)
-        
-        # convert ----- to <hr class="book-section-divider">
-        parsed = parsed.replace('-----', '<hr class="book-section-divider">')
-        
-        # Wrap in paragraph tags
-        formatted_paragraphs.append(f"<p>{parsed}</p>")
-    
-    return ''.join(formatted_paragraphs)
\ No newline at end of file
+    return ''.join([_render_paragraph(paragraph) for paragraph in text.split('\n') if paragraph.strip()])
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of English prose (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+class MarkdownStreamRenderer:
+    """
+    Incremental version of parse_markdown for streamed text. `feed` takes the
+    next chunk and returns the HTML of the paragraphs it completed; `flush`
+    returns the HTML of the last, unterminated paragraph. Concatenating all
+    output gives the same result as parse_markdown on the whole text.
+    """
+
+    def __init__(self):
+        # Chunks of the unterminated paragraph, joined only once it is complete
+        self._pending = []
+
+    @property
+    def pending(self) -> str:
+        """Text of the paragraph that is still being written."""
+        return ''.join(self._pending)
+
+    def feed(self, chunk: str) -> str:
+        if '\n' not in chunk:
+            if chunk:
+                self._pending.append(chunk)
+            return ""
+        self._pending.append(chunk)
+        paragraphs = ''.join(self._pending).split('\n')
+        last = paragraphs.pop()
+        self._pending = [last] if last else []
+        return ''.join(_render_paragraph(paragraph) for paragraph in paragraphs if paragraph.strip())
+
+    def flush(self) -> str:
+        paragraph = ''.join(self._pending)
+        self._pending = []
+        return _render_paragraph(paragraph) if paragraph.strip() else ""
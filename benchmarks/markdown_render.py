@@ -0,0 +1,82 @@
+"""
+Compares app.utils.text_parser.parse_markdown with the replace-loop renderer it
+replaced, on long chapters. On typical chapters both take about the same time;
+the replace loop is quadratic in the markers per paragraph, so the difference
+shows on marker-heavy and very long paragraphs. Streaming in small chunks
+costs extra per chunk. Run from the repository root:
+
+    python -m benchmarks.markdown_render
+"""
+
+import random
+import timeit
+
+from app.utils.text_parser import MarkdownStreamRenderer, parse_markdown
+
+
+def legacy_parse_markdown(text: str) -> str:
+    """The previous implementation, kept for comparison."""
+    if not text:
+        return ""
+    paragraphs = text.split('\n')
+    formatted_paragraphs = []
+    for paragraph in paragraphs:
+        if not paragraph.strip():
+            continue
+        parsed = paragraph.replace('**', '<strong>', 1)
+        while '**' in parsed:
+            parsed = parsed.replace('**', '</strong>', 1)
+        parsed = parsed.replace('*', '<em>', 1)
+        while '*' in parsed:
+            parsed = parsed.replace('*', '</em>', 1)
+        parsed = parsed.replace('-----', '<hr class="book-section-divider">')
+        formatted_paragraphs.append(f"<p>{parsed}</p>")
+    return ''.join(formatted_paragraphs)
+
+
+def make_chapter(paragraphs: int, markers_per_paragraph: int, seed: int = 42) -> str:
+    rng = random.Random(seed)
+    words = ["the", "ship", "cook", "sergeant", "whispered", "soup", "night", "letter", "laughed", "door"]
+    markers = ["**", "*", "-----"]
+    lines = []
+    for _ in range(paragraphs):
+        tokens = []
+        for _ in range(markers_per_paragraph):
+            tokens.extend(rng.choice(words) for _ in range(8))
+            tokens.append(rng.choice(markers))
+        lines.append(" ".join(tokens))
+    return "\n\n".join(lines)
+
+
+def stream_render(text: str, chunk_size: int = 12) -> str:
+    renderer = MarkdownStreamRenderer()
+    parts = [renderer.feed(text[i:i + chunk_size]) for i in range(0, len(text), chunk_size)]
+    parts.append(renderer.flush())
+    return "".join(parts)
+
+
+def main() -> None:
+    cases = [
+        ("typical chapter", make_chapter(paragraphs=60, markers_per_paragraph=4)),
+        ("marker-heavy paragraphs", make_chapter(paragraphs=60, markers_per_paragraph=200)),
+        ("one huge paragraph", make_chapter(paragraphs=1, markers_per_paragraph=5000)),
+    ]
+    for name, text in cases:
+        expected = legacy_parse_markdown(text)
+        assert parse_markdown(text) == expected, f"{name}: output differs from the legacy renderer"
+        assert stream_render(text) == expected, f"{name}: streamed output differs from the legacy renderer"
+
+        # Short inputs are timed over several calls per run to get above timer noise
+        runs, number = 5, max(1, 200_000 // len(text))
+        legacy = min(timeit.repeat(lambda: legacy_parse_markdown(text), number=number, repeat=runs)) / number
+        current = min(timeit.repeat(lambda: parse_markdown(text), number=number, repeat=runs)) / number
+        streamed = min(timeit.repeat(lambda: stream_render(text), number=number, repeat=runs)) / number
+        print(
+            f"{name:<25} {len(text):>9} chars  legacy {legacy * 1000:9.2f} ms  "
+            f"single-pass {current * 1000:7.2f} ms  streamed {streamed * 1000:7.2f} ms  "
+            f"speedup {legacy / current:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compares the vector backends of app.services.vector_backends on a book-sized
+collection of random vectors: startup time (import, open and first query of an
+existing collection), query latency and peak RSS. Every backend runs in its own
+process so imports and memory are measured separately. Run from the
+repository root:
+
+    python -m benchmarks.vector_backends [--records 2000] [--dim 1024]
+"""
+
+import argparse
+import json
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKENDS = ["numpy", "chroma"]
+
+
+def random_vectors(count: int, dim: int, seed: int):
+    rng = random.Random(seed)
+    return [[rng.gauss(0.0, 1.0) for _ in range(dim)] for _ in range(count)]
+
+
+def populate(backend_name: str, directory: str, records: int, dim: int) -> None:
+    from app.services.vector_backends import create_vector_backend
+
+    backend = create_vector_backend(backend_name, directory)
+    batch = 500
+    for start in range(0, records, batch):
+        count = min(batch, records - start)
+        backend.upsert(
+            "book_1",
+            ids=[f"chapter-{start + i}" for i in range(count)],
+            texts=[f"passage {start + i}" for i in range(count)],
+            vectors=random_vectors(count, dim, seed=start),
+            metadatas=[{"kind": "chapter", "chapter_number": (start + i) // 20} for i in range(count)],
+        )
+    backend.close()
+
+
+def measure(backend_name: str, directory: str, dim: int, queries: int) -> dict:
+    query_vectors = random_vectors(queries, dim, seed=-1)
+    where = {"$and": [{"kind": "chapter"}, {"chapter_number": {"$lt": 50}}]}
+
+    started = time.perf_counter()
+    from app.services.vector_backends import create_vector_backend
+
+    backend = create_vector_backend(backend_name, directory)
+    backend.query("book_1", query_vectors[0], 8, where)
+    startup = time.perf_counter() - started
+
+    latencies = []
+    for vector in query_vectors:
+        query_started = time.perf_counter()
+        backend.query("book_1", vector, 8, where)
+        latencies.append(time.perf_counter() - query_started)
+    backend.close()
+    latencies.sort()
+    return {
+        "startup_ms": startup * 1000,
+        "median_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        # ru_maxrss is in KiB on Linux
+        "rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_child(*args: str) -> str:
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.vector_backends", *args], capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return result.stdout
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--child", choices=["populate", "measure"])
+    parser.add_argument("--backend", choices=BACKENDS)
+    parser.add_argument("--dir")
+    args = parser.parse_args()
+
+    if args.child == "populate":
+        populate(args.backend, args.dir, args.records, args.dim)
+        return
+    if args.child == "measure":
+        print(json.dumps(measure(args.backend, args.dir, args.dim, args.queries)))
+        return
+
+    print(f"{args.records} records of {args.dim} dimensions, {args.queries} filtered top-8 queries")
+    for backend_name in BACKENDS:
+        with tempfile.TemporaryDirectory() as directory:
+            common = ["--backend", backend_name, "--dir", directory, "--records", str(args.records),
+                      "--dim", str(args.dim), "--queries", str(args.queries)]
+            try:
+                run_child("--child", "populate", *common)
+                result = json.loads(run_child("--child", "measure", *common))
+            except RuntimeError as e:
+                print(f"{backend_name:<8} skipped: {e}")
+                continue
+        print(
+            f"{backend_name:<8} startup {result['startup_ms']:8.1f} ms  "
+            f"query median {result['median_ms']:7.3f} ms  p95 {result['p95_ms']:7.3f} ms  "
+            f"peak RSS {result['rss_mib']:7.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()